@@ -1,7 +1,46 @@
 from .base import TLE as TLE
-from .base import TLE_4 as TLE_2
+from .base import TLE_2 as TLE_2
 from .base import TLE_4 as TLE_4
 from .base import demo
-from .tle_fitter import tle_fitter
-from .tle_fitter import test as tle_fitter_test
-import test
+
+# everything else needs numpy (and some of it sgp4) : imported on first attribute access, so that
+# `import PyTLE` and single TLE parse / generate do not pay for them
+_LAZY = {
+        'TLECatalog'           : ( '.catalog',    'TLECatalog' ),
+        'TLEIndex'             : ( '.index',      'TLEIndex' ),
+        'TLEReader'            : ( '.reader',     'TLEReader' ),
+        'TLEMerger'            : ( '.merge',      'TLEMerger' ),
+        'TLEIngest'            : ( '.ingest',     'TLEIngest' ),
+        'cached_catalog'       : ( '.cache',      'cached_catalog' ),
+        'SatrecCache'          : ( '.propagator', 'SatrecCache' ),
+        'LazyTLE'              : ( '.lazy',       'LazyTLE' ),
+        'tle_fitter'           : ( '.tle_fitter', 'tle_fitter' ),
+        'tle_fitter_test'      : ( '.tle_fitter', 'test' ),
+        'fit_catalog'          : ( '.catalog_fit', 'fit_catalog' ),
+        'fit_ephemeris_global' : ( '.global_fit', 'fit_ephemeris_global' ),
+        }
+
+__all__ = [ 'TLE', 'TLE_2', 'TLE_4', 'demo' ] + list( _LAZY )
+
+def __getattr__( name ):
+    if name not in _LAZY: raise AttributeError( 'module {!r} has no attribute {!r}'.format( __name__, name ) )
+    from importlib import import_module
+    module, attr = _LAZY[ name ]
+    value = getattr( import_module( module, __name__ ), attr )
+    globals()[ name ] = value
+    return value
+
+def __dir__( ): return sorted( set( globals() ) | set( _LAZY ) )
+
+# importing a submodule binds it on the package (PyTLE.tle_fitter = <module>), which would shadow the class
+# of the same name that the eager imports used to leave there ; keep the exported object instead
+import sys as _sys
+import types as _types
+
+class _Package( _types.ModuleType ):
+    def __setattr__( self, name, value ):
+        if name in _LAZY and isinstance( value, _types.ModuleType ) and value.__name__ == '{}.{}'.format( __name__, name ):
+            value = getattr( value, _LAZY[ name ][1] )
+        super().__setattr__( name, value )
+
+_sys.modules[ __name__ ].__class__ = _Package
@@ -47,6 +47,16 @@ def integer_to_alpha(I):
     lkup = intstr[0:2]
     return to_alpha[ int(lkup) ] + intstr[2:][0:5]
 
+# -----------------------------------------------------------------------------------------------------
+# the array versions live in arrays.py (numpy) ; still reachable from here, imported on first use
+_ARRAYS = ( 'alpha_to_integer_array', 'integer_to_alpha_array' )
+
+def __getattr__( name ):
+    if name in _ARRAYS:
+        from . import arrays
+        return getattr( arrays, name )
+    raise AttributeError( 'module {!r} has no attribute {!r}'.format( __name__, name ) )
+
 
 def test_xform():
     test_i = range(1,340000,100)
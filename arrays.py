@@ -0,0 +1,144 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+# array versions of the alpha / formatters helpers, for catalogs ; kept apart so that
+# parsing and generating single TLEs never has to import numpy
+import numpy as np
+from .alpha import from_alpha, to_alpha
+
+# -----------------------------------------------------------------------------------------------------
+# satnos : lookup tables instead of the alpha dicts, error masks instead of exceptions
+
+# first character of the 5 character field --> value of the leading digit(s), -1 if invalid
+_LEAD_VALUE = np.full( 256, -1, dtype=np.int64 )
+_LEAD_VALUE[ ord(' ') ] = 0
+_LEAD_VALUE[ ord('0'):ord('9')+1 ] = np.arange(10)
+for _c, _v in from_alpha.items(): _LEAD_VALUE[ ord(_c) ] = _v
+
+# integer // 10000 --> leading character
+_LEAD_CHAR = np.frombuffer( ( '0123456789' + ''.join( to_alpha[i] for i in range(10, 34) ) ).encode(), dtype=np.uint8 )
+_PLACE     = np.array( [ 1000, 100, 10, 1 ], dtype=np.int64 )
+
+def _as_field_array( S ):
+    ''' (N, 5) uint8, or an array / list of 5 character str / bytes --> (N, 5) uint8 '''
+    S = np.asarray( S )
+    if S.dtype == np.uint8: return S.reshape( -1, 5 )
+    if S.dtype.kind == 'U': S = np.char.encode( S, 'ascii' )
+    return np.frombuffer( np.char.rjust( S.astype( 'S5' ), 5 ).tobytes(), dtype=np.uint8 ).reshape( -1, 5 )
+
+def alpha_to_integer_array( S ):
+    '''
+    alpha_to_integer for many satno fields at once : S is (N, 5) uint8 (or str / bytes of 5 characters)
+    returns ( int64 satnos, error mask ) ; blanks count as zeros, invalid fields come back as -1
+    '''
+    A = _as_field_array( S )
+    lead = _LEAD_VALUE[ A[:, 0] ]
+    D = A[:, 1:].astype( np.int64 ) - ord('0')
+    D[ A[:, 1:] == ord(' ') ] = 0
+    bad = ( lead < 0 ) | np.any( ( D < 0 ) | ( D > 9 ), axis=1 )
+    return np.where( bad, -1, lead * 10000 + D @ _PLACE ), bad
+
+def integer_to_alpha_array( I ):
+    '''
+    integer_to_alpha for many satnos at once (zero padded to 5 characters, alpha-5 above 99999)
+    returns ( (N, 5) uint8 fields, error mask for values outside 0 -- 339999 ) ; bad rows are '?????'
+    '''
+    I = np.atleast_1d( np.asarray( I, dtype=np.int64 ) )
+    bad = ( I < 0 ) | ( I > 339999 )
+    A = np.empty( ( len(I), 5 ), dtype=np.uint8 )
+    A[:, 0]  = _LEAD_CHAR[ np.clip( I // 10000, 0, len(_LEAD_CHAR) - 1 ) ]
+    A[:, 1:] = ( I[:, None] // _PLACE ) % 10 + ord('0')
+    A[ bad ] = ord('?')
+    return A, bad
+
+# -----------------------------------------------------------------------------------------------------
+def generate_checksums( A, stop=68 ):
+    ''' generate_checksum for every row of an (N, >= stop) uint8 array of lines (columns [0, stop)) --> uint8 ASCII digits '''
+    # plain uint8 arithmetic (a lookup table take is several times slower here) : digits count their value, '-' counts 1
+    D = A[:, :stop] - np.uint8( ord('0') )
+    V = D * ( D < 10 ) + ( A[:, :stop] == ord('-') )
+    return ( V.sum( axis=1, dtype=np.uint16 ) % 10 + ord('0') ).astype( np.uint8 )
+
+# -----------------------------------------------------------------------------------------------------
+# epochs : many at once, as numpy datetime64
+
+_NS_PER_DAY  = 86400 * 1000000000
+_NS_PER_1E8  = 864000                   # 1e-8 day
+_EPOCH_PLACE = np.array( [ 10 ** i for i in range(7, -1, -1) ], dtype=np.int64 )
+
+def epoch_parts_to_datetime64( yy, ddd, dec, unit='ns' ):
+    ''' integer YY, DDD and the 8 decimal digits (as one integer) --> datetime64 '''
+    yy    = np.asarray( yy, dtype=np.int64 )
+    year  = np.where( yy >= 57, 1900 + yy, 2000 + yy )
+    tyear = ( year - 1970 ).astype( 'datetime64[Y]' ).astype( 'datetime64[us]' )
+    usec  = ( np.asarray( ddd, dtype=np.int64 ) - 1 ) * 86400000000 + np.asarray( dec, dtype=np.int64 ) * 864
+    return ( tyear + usec.astype( 'timedelta64[us]' ) ).astype( 'datetime64[{}]'.format( unit ) )
+
+def _epoch_chars( S ):
+    ''' str / bytes array (or (N, 14) uint8) of epoch fields --> (N, 14) uint8 '''
+    S = np.asarray( S )
+    if S.dtype == np.uint8 and S.ndim == 2: return S[:, :14]
+    if S.dtype.kind == 'U': S = np.char.encode( S, 'ascii' )
+    return np.frombuffer( S.astype( 'S14' ).tobytes(), dtype=np.uint8 ).reshape( -1, 14 )
+
+def epoch_str_to_datetime64( S, unit='ns' ):
+    ''' array of YYDDD.DDDDDDDD fields --> datetime64 array (exact, no float rounding) '''
+    A = _epoch_chars( S )
+    D = A.astype( np.int64 ) - ord('0')
+    D[ ( A == ord(' ') ) | ( A == 0 ) ] = 0
+    digits = np.r_[ 0:5, 6:14 ]
+    if np.any( ( D[:, digits] < 0 ) | ( D[:, digits] > 9 ) ) or np.any( A[:, 5] != ord('.') ):
+        raise Exception('malformed epoch in {} records'.format( np.sum( np.any( ( D[:, digits] < 0 ) | ( D[:, digits] > 9 ), axis=1 ) | ( A[:, 5] != ord('.') ) ) ))
+    return epoch_parts_to_datetime64( D[:, 0] * 10 + D[:, 1], D[:, 2:5] @ _EPOCH_PLACE[-3:], D[:, 6:14] @ _EPOCH_PLACE, unit )
+
+def epoch_str_to_jd( S, split : bool = False ):
+    ''' array of YYDDD.DDDDDDDD fields --> julian dates (split=True : whole + fraction, see julian.datetime_to_jd) '''
+    from .utils import julian
+    return julian.datetime_to_jd( epoch_str_to_datetime64( S, unit='us' ), split=split )
+
+def datetime64_to_epoch_parts( dts ):
+    ''' datetimes --> YY, DDD, 8 decimal digits (int64 arrays) and a mask of the ones outside 1957 -- 2056 '''
+    ns   = np.atleast_1d( np.asarray( dts, dtype='datetime64[ns]' ) )
+    Y    = ns.astype( 'datetime64[Y]' )
+    rem  = ( ns - Y ).astype( np.int64 )
+    days = rem // _NS_PER_DAY
+    dec  = ( rem - days * _NS_PER_DAY + _NS_PER_1E8 // 2 ) // _NS_PER_1E8
+    carry = dec == 100000000
+    days, dec = days + carry, np.where( carry, 0, dec )
+    # rounding up to midnight of December 31st carries into the next year (and 2056 out of the window)
+    roll = days == ( ( Y + 1 ).astype( 'datetime64[D]' ) - Y.astype( 'datetime64[D]' ) ).astype( np.int64 )
+    days = np.where( roll, 0, days )
+    year = Y.astype( np.int64 ) + 1970 + roll
+    return year % 100, days + 1, dec, ( year < 1957 ) | ( year > 2056 )
+
+def datetime64_to_epoch_str( dts ):
+    ''' datetimes --> S14 array of YYDDD.DDDDDDDD fields '''
+    yy, ddd, dec, bad = datetime64_to_epoch_parts( dts )
+    if np.any( bad ): raise Exception('{} epochs outside of the 1957 -- 2056 TLE window'.format( np.sum(bad) ))
+    A = np.empty( ( len(yy), 14 ), dtype=np.uint8 )
+    A[:, 0:2]  = ( yy[:, None] // _EPOCH_PLACE[-2:] ) % 10 + ord('0')
+    A[:, 2:5]  = ( ddd[:, None] // _EPOCH_PLACE[-3:] ) % 10 + ord('0')
+    A[:, 5]    = ord('.')
+    A[:, 6:14] = ( dec[:, None] // _EPOCH_PLACE ) % 10 + ord('0')
+    return A.view( 'S14' ).ravel()
@@ -22,24 +22,40 @@
 # SOFTWARE.
 # ###############################################################################
 
+from __future__ import annotations
+import math
 from datetime import datetime, timedelta
-from sgp4.ext import rv2coe
-import numpy as np
 
+# numpy, sgp4 and the array modules (orbit, julian, catalog) are imported where they are used, so that
+# `import PyTLE` and parsing / generating single TLEs stay light
 from .alpha import alpha_to_integer, integer_to_alpha
 
 from .formatters import generate_expo_format, process_expo_format
 from .formatters import epoch_str_todatetime, datetime_to_epochstr
+from .formatters import generate_checksum
 
 WGS84  = 398600.5
+EARTH_RADIUS = 6378.135         # km, space-track
+SMA_K        = 8681663.653      # a = ( SMA_K / mean motion [rev/day] ) ** (2/3), km
 gL1    = '1 25544U 98067A   23137.83559306  .00011914  00000-0  21418-3 0  9990'
 gL2    = '2 25544  51.6409 118.9691 0006630 359.0829  72.4864 15.50282135397083'
 gEPOCH = datetime.fromisoformat('2000-01-01T00:00:00.000') 
 
 # -----------------------------------------------------------------------------------------------------
+# whole line templates for the common case (numeric satno, every field within its width) ; generateLine1 / 2
+# fall back to the field by field formatting (with its truncations) whenever the result is not 68 columns
+_LINE1_T2 = '1 {:05d}{} {:>8.8} {} {} {} {} 0 {:>4}'.format
+_LINE1_T4 = '1 {:05d}{} {:>8.8} {} +.00000000 {} {} 4 {:04d}'.format
+_LINE2    = '2 {:05d} {:>8.4f} {:>8.4f} {} {:>8.4f} {:>8.4f} {:>011.8f} {:04d}'.format
+
 def format_ecc( ecc ):
     return '{:9.7f}'.format(ecc)[2:].ljust(7,'0')
 
+def format_ndot( ndot ):
+    # negative values keep the 10 column layout as "-.00001234" (plain formatting gave an 11 column "-0.00001234")
+    if ndot < 0 and ndot > -1: return '-' + '{:09.8f}'.format( -ndot )[1:]
+    return "{:09.8f}".format( ndot ).ljust(9,' ')
+
 # -----------------------------------------------------------------------------------------------------
 class TLE:
     def __init__(self, L1=None, L2=None):
@@ -49,6 +65,7 @@ class TLE:
         self._epoch = gEPOCH
         self._line1 = None
         self._line2 = None
+        self._linekey = None
         self._satno = 99999
         self._class = 'U'
         self._intld = ''
@@ -71,6 +88,7 @@ class TLE:
         # human readable / helper
         self._perigee = None
         self._apogee  = None
+        self._apsides = None
 
         # old fields
         self._elset   = 0
@@ -111,7 +129,7 @@ class TLE:
 
     @eccentricity.setter
     def eccentricity( self, ecc ):
-        self._ecc = np.clip( ecc, 0, 1 )
+        self._ecc = min( max( float( ecc ), 0. ), 1. )
 
     @property 
     def arg_perigee( self ): return self._argp
@@ -147,14 +165,16 @@ class TLE:
         self._intld = note[:8]
         return self
         
+    # perigee / apogee (and the lines, see generateLines) are cached along with the values they came from, so
+    # edits through the setters, tle_fitter.from_array or straight to the data members are all picked up
     @property
     def perigee( self ):
-        if self._perigee is None: self._calculate_apogee_perigee()
+        if self._perigee is None or self._apsides != ( self._mm, self._ecc ): self._calculate_apogee_perigee()
         return self._perigee
     
     @property
     def apogee( self ):
-        if self._apogee is None: self._calculate_apogee_perigee()
+        if self._apogee is None or self._apsides != ( self._mm, self._ecc ): self._calculate_apogee_perigee()
         return self._apogee
 
     def parseDate( self, S ):
@@ -175,23 +195,16 @@ class TLE:
         return TLE_4()
 
 
-    def _calculate_apogee_perigee( self, earth_rad = 6378.135):
-        ''' Default value for earth_rad is taken from space-track.
-        space-track : https://www.space-track.org/documentation#/faq
-        Additional references: http://www.satobs.org/seesat/Dec-2002/0197.html
-        [I192G'''
-        semi_major = (8681663.653 / self.mean_motion) ** (2.0/3.0)
-        self.perigee = ( semi_major * (1 - self.eccentricity) ) - earth_rad
-        self.apogee =  ( semi_major * (1 + self.eccentricity) ) - earth_rad
-
-    def _calculate_apogee_perigee( self, earth_rad = 6378.135):
+    def _calculate_apogee_perigee( self, earth_rad = EARTH_RADIUS):
         ''' Default value for earth_rad is taken from space-track.
         space-track : https://www.space-track.org/documentation#/faq
         Additional references: http://www.satobs.org/seesat/Dec-2002/0197.html
+        (orbit.shells is the array version, used for TLECatalog.derived)
         '''
-        semi_major = (8681663.653 / self.mean_motion) ** (2.0/3.0)
+        semi_major = (SMA_K / self.mean_motion) ** (2.0/3.0)
         self._perigee = ( semi_major * (1 - self.eccentricity) ) - earth_rad
         self._apogee =  ( semi_major * (1 + self.eccentricity) ) - earth_rad
+        self._apsides = ( self._mm, self._ecc )
 
 
     @staticmethod
@@ -224,8 +237,8 @@ class TLE:
         tle._raan = raan 
         tle._ma   = mean_anomaly
         # calculate the mean motion (these are km values, so we get rads/s, convert to TLE units)
-        mm = np.sqrt(EARTHMU / a ** 3)
-        tle._mm = (mm * 86400) / (2 * np.pi)
+        mm = math.sqrt(EARTHMU / a ** 3)
+        tle._mm = (mm * 86400) / (2 * math.pi)
         tle._epoch = epoch
         return tle
 
@@ -245,6 +258,7 @@ class TLE:
         fromPV : given state position and velocity (in TEME), build an initial TLE
         note   : this is *not* going to build mean elements
         '''
+        from sgp4.ext import rv2coe
         # return p, a, ecc, incl, omega, argp, nu, m, arglat, truelon, lonper
         if V[2] == 0:
             raise Exception('cannot init an orbit with perfectly zero inclination (velocity[Z] ~ 1e-5km/s minimum)')
@@ -267,16 +281,128 @@ class TLE:
                 satno=satno, 
                 a=a, 
                 ecc=ecc, 
-                incl=np.degrees(incl), 
-                argp=np.degrees(argp), 
-                raan=np.degrees(omega), 
-                mean_anomaly=np.degrees(m),
+                incl=math.degrees(incl), 
+                argp=math.degrees(argp), 
+                raan=math.degrees(omega), 
+                mean_anomaly=math.degrees(m),
                 bstar = bstar,
                 bterm = bterm,
                 agom  = agom,
                 EARTHMU = EARTHMU)
 
 
+    @staticmethod
+    def fromCOE_batch(epochs,
+                      type  = 0,
+                      satno = 99999,
+                      a=7000, ecc=1e-10, incl=1e-3, argp=0, raan=0, mean_anomaly=0,   # COE elements (arrays or scalars)
+                      bstar = 0,                                                    # TLE type 0/2 only
+                      bterm = 0,
+                      agom  = 0,
+                      EARTHMU : float = WGS84,
+                      catalog : bool = True,
+                      **kwargs):
+        '''
+        fromCOE for N elsets at once (degrees and km), every argument is an array of N or a scalar
+        returns ( TLECatalog, or a list of TLE_2 / TLE_4 with catalog=False ; status per row, see orbit.STATUS_* )
+        rows with a non-zero status hold the fromCOE defaults (as fromPV falls back to)
+        '''
+        import numpy as np
+        from . import orbit
+        epochs = np.atleast_1d( np.asarray( epochs, dtype='datetime64[us]' ) )
+        N = max( len(epochs), *( np.size(X) for X in ( type, satno, a, ecc, incl, argp, raan, mean_anomaly, bstar, bterm, agom ) ) )
+        col = lambda X, dt=float : np.broadcast_to( np.asarray( X, dtype=dt ), (N,) )
+
+        a, ecc, incl = col( a ), col( ecc ), col( incl )
+        argp, raan, ma = col( argp ), col( raan ), col( mean_anomaly )
+        status = np.where( a < 0, orbit.STATUS_NEGATIVE_SMA, orbit.STATUS_OK )
+        finite = np.isfinite( a ) & np.isfinite( ecc ) & np.isfinite( incl ) & np.isfinite( argp ) & np.isfinite( raan ) & np.isfinite( ma )
+        status = np.where( finite, status, orbit.STATUS_NONFINITE )
+        return TLE._coe_rows( epochs, col( type, np.int8 ), col( satno, np.int64 ), a, ecc, incl, argp, raan, ma,
+                              col( bstar ), col( bterm ), col( agom ), EARTHMU, status, catalog )
+
+    @staticmethod
+    def fromPV_batch(epochs,
+                     P : np.array,
+                     V : np.array,
+                     type  = 0,
+                     satno = 99999,
+                     bstar = 0,                                                     # TLE type 0/2 only
+                     bterm = 0,
+                     agom  = 0,
+                     EARTHMU : float = WGS84,
+                     catalog : bool = True,
+                     **kwargs):
+        '''
+        fromPV for N state vectors at once : P, V are (N, 3) in TEME (km, km/s)
+        returns ( TLECatalog, or a list of TLE_2 / TLE_4 with catalog=False ; status per row, see orbit.STATUS_* )
+        note   : this is *not* going to build mean elements
+        '''
+        import numpy as np
+        from . import orbit
+        P = np.atleast_2d( np.asarray( P, dtype=float ) )
+        V = np.atleast_2d( np.asarray( V, dtype=float ) )
+        p, a, ecc, incl, omega, argp, nu, m, arglat, truelon, lonper = orbit.rv2coe( P, V, EARTHMU )
+
+        # same checks as fromPV, in the same order
+        status = np.full( len(P), orbit.STATUS_OK )
+        status[ a < 0 ] = orbit.STATUS_NEGATIVE_SMA
+        status[ np.any( np.stack( [p, a, ecc, incl, omega, argp, nu, m] ) > 999999., axis=0 ) ] = orbit.STATUS_UNDEFINED
+        status[ V[:, 2] == 0 ] = orbit.STATUS_ZERO_INCL
+        status[ ~np.all( np.isfinite( P ) & np.isfinite( V ), axis=1 ) ] = orbit.STATUS_NONFINITE
+
+        epochs = np.atleast_1d( np.asarray( epochs, dtype='datetime64[us]' ) )
+        N   = len(P)
+        col = lambda X, dt=float : np.broadcast_to( np.asarray( X, dtype=dt ), (N,) )
+        return TLE._coe_rows( np.broadcast_to( epochs, (N,) ), col( type, np.int8 ), col( satno, np.int64 ),
+                              a, ecc, np.degrees( incl ), np.degrees( argp ), np.degrees( omega ), np.degrees( m ),
+                              col( bstar ), col( bterm ), col( agom ), EARTHMU, status, catalog )
+
+    @staticmethod
+    def _coe_rows( epochs, type, satno, a, ecc, incl, argp, raan, ma, bstar, bterm, agom, EARTHMU, status, catalog ):
+        ''' fill a TLECatalog from COE columns, rows with a non-zero status get the fromCOE defaults '''
+        import numpy as np
+        from . import orbit
+        from .catalog import TLECatalog, TLE_DTYPE
+        from .utils import julian
+        N    = len(status)
+        good = status == orbit.STATUS_OK
+        t4   = type == 4
+        data = np.zeros( N, dtype=TLE_DTYPE )
+        data['satno'] = satno
+        data['class'] = 'U'
+        data['epoch'] = np.broadcast_to( epochs, (N,) )
+        data['jd']    = julian.datetime_to_jd( data['epoch'] )
+        data['type']  = np.where( t4, 4, 0 )
+        data['bstar'] = np.where( t4, 0., bstar )
+        data['B']     = np.where( t4, bterm, 0. )
+        data['agom']  = np.where( t4, agom, 0. )
+        data['incl']  = np.where( good, incl, 1e-3 )
+        data['ecc']   = np.where( good, ecc, 1e-10 )
+        data['argp']  = np.where( good, argp, 0. )
+        data['raan']  = np.where( good, raan, 0. )
+        data['ma']    = np.where( good, ma, 0. )
+        data['mm']    = orbit.mean_motion( np.where( good, a, 7000. ), EARTHMU )
+        cat = TLECatalog( data )
+        return ( cat if catalog else cat.tles() ), status
+
+    def _state( self ):
+        ''' every data member that goes into the lines '''
+        return ( self._type, self._satno, self._class, self._intld, self._epoch, self._elset, self._ndot, self._ndotdot,
+                 self._bstar, self._B, self._agom, self._incl, self._raan, self._ecc, self._argp, self._ma, self._mm )
+
+    def _lines( self ):
+        ''' ( line 1, line 2 ), only regenerated when a data member changed since they were built '''
+        state = self._state()
+        if state != self._linekey:
+            self._line1, self._line2 = self._buildLine1(), self._buildLine2()
+            self._linekey = state
+        return self._line1, self._line2
+
+    def generateLine1( self ): return self._lines()[0]
+
+    def generateLine2( self ): return self._lines()[1]
+
     def __str__( self ): return '\n'.join( self.generateLines() )
     
     def __repr__( self ): return str(self)
@@ -308,7 +434,7 @@ class TLE_2( TLE ):
         if alpha_to_integer( S[2:7] ) != self._satno : raise Exception('satno does not match')
         self._incl = float(S[8:16])
         self._raan = float(S[17:25])
-        self._ecc  = float( '0.{}'.format( S[26:33] ) )
+        self._ecc  = float( '0.' + S[26:33] )
         self._argp = float(S[34:42])
         self._ma   = float(S[43:51])
         self._mm   = float(S[52:63])
@@ -317,26 +443,40 @@ class TLE_2( TLE ):
         self.parseLine1( L1 )
         self.parseLine2( L2 )
 
-    def generateLine1( self ):
+    def _buildLine1( self ):
+        if 0 <= self._satno < 100000:
+            L1 = _LINE1_T2( int( self._satno ), self._class[0], self._intld, datetime_to_epochstr( self._epoch ),
+                            format_ndot( self._ndot ), generate_expo_format( self._ndotdot ), generate_expo_format( self._bstar ),
+                            self._elset )
+            if len(L1) == 68: return L1 + generate_checksum( L1 )
+        return self._formatLine1()
+
+    def _formatLine1( self ):
+        ''' field by field (every width enforced), for what does not fit the template '''
         #1 25544U 98067A   23137.83559306  .00011914  00000-0  21418-3 0  9990
-        L1 = '1 {:5}{:1} {:8} {:14} {} {} {} {} {}0'.format(
+        L1 = '1 {:5}{:1} {:8} {:14} {} {} {} {} {}'.format(
                 integer_to_alpha( self._satno ).rjust(5,'0'),
                 self._class[0],
                 self._intld[:8].rjust(8,' '),
                 datetime_to_epochstr( self._epoch ),
-                "{:09.8f}".format( self._ndot ).ljust(9,' '),
+                format_ndot( self._ndot ),
                 generate_expo_format( self._ndotdot),
                 generate_expo_format( self._bstar ),
                 0,  # <--------- TYPE FLAG
                 "{}".format( self._elset ).rjust(4,' ')
                 )
+        return L1 + generate_checksum( L1 )
 
-                #self._elset )
-        return L1
+    def _buildLine2( self ):
+        if 0 <= self._satno < 100000:
+            L2 = _LINE2( int( self._satno ), self._incl, self._raan, format_ecc( self._ecc ), self._argp, self._ma, self._mm, self._elset )
+            if len(L2) == 68: return L2 + generate_checksum( L2 )
+        return self._formatLine2()
 
-    def generateLine2( self ):
+    def _formatLine2( self ):
+        ''' field by field (every width enforced), for what does not fit the template '''
         #L2='2 12345   9.7332 113.4837 7006332 206.5371  38.9576 01.00149480000003'
-        L2 = '2 {:5} {:8} {:8} {:7} {:8} {:8} {} {}3 '.format(
+        L2 = '2 {:5} {:8} {:8} {:7} {:8} {:8} {} {}'.format(
                 integer_to_alpha( self._satno ).rjust(5,'0'),
                 "{:>8.4f}".format( self._incl )[:8], 
                 "{:>8.4f}".format( self._raan)[:8], 
@@ -347,10 +487,10 @@ class TLE_2( TLE ):
                 "{:>011.8f}".format( self._mm)[:12], 
                 "{:04d}".format( self._elset)[:4]
                 )
-        return L2
+        return L2 + generate_checksum( L2 )
     
     def generateLines( self ):
-        return ( self.generateLine1(), self.generateLine2() )
+        return self._lines()
 
 
 
@@ -377,7 +517,7 @@ class TLE_4( TLE ):
         if alpha_to_integer( S[2:7] ) != self._satno : raise Exception('satno does not match')
         self._incl = float(S[8:16])
         self._raan = float(S[17:25])
-        self._ecc  = float( '0.{}'.format( S[26:33] ) )
+        self._ecc  = float( '0.' + S[26:33] )
         self._argp = float(S[34:42])
         self._ma   = float(S[43:51])
         self._mm   = float(S[52:63])
@@ -386,7 +526,15 @@ class TLE_4( TLE ):
         self.parseLine1( L1 )
         self.parseLine2( L2 )
 
-    def generateLine1( self ):
+    def _buildLine1( self ):
+        if 0 <= self._satno < 100000 and 0 <= self._elset < 10000:
+            L1 = _LINE1_T4( int( self._satno ), self._class[0], self._intld, datetime_to_epochstr( self._epoch ),
+                            generate_expo_format( self._agom ), generate_expo_format( self._B ), self._elset )
+            if len(L1) == 68: return L1 + generate_checksum( L1 )
+        return self._formatLine1()
+
+    def _formatLine1( self ):
+        ''' field by field (every width enforced), for what does not fit the template '''
         #L1='1 12345U xyzzyz   23038.45547454 +.00000000 +46171+0 +33000-1 4 99992'
         L1 = '1 {:5}{:1} {:8} {:14} +.00000000 {} {} 4 {}'.format(
                 integer_to_alpha( self._satno ).rjust(5,'0'),
@@ -397,9 +545,16 @@ class TLE_4( TLE ):
                 generate_expo_format( self._B ),
                 "{:d}".format( self._elset).rjust(4,'0')[-4:]
                  )
-        return L1
+        return L1 + generate_checksum( L1 )
+
+    def _buildLine2( self ):
+        if 0 <= self._satno < 100000 and 0 <= self._elset < 10000:
+            L2 = _LINE2( int( self._satno ), self._incl, self._raan, format_ecc( self._ecc ), self._argp, self._ma, self._mm, self._elset )
+            if len(L2) == 68: return L2 + generate_checksum( L2 )
+        return self._formatLine2()
 
-    def generateLine2( self ):
+    def _formatLine2( self ):
+        ''' field by field (every width enforced), for what does not fit the template '''
         #L2='2 12345   9.7332 113.4837 7006332 206.5371  38.9576 01.00149480000003'
         L2 = '2 {:5} {:8} {:8} {:7} {:8} {:8} {} {}'.format(
                 integer_to_alpha( self._satno ).rjust(5,'0'),
@@ -412,10 +567,10 @@ class TLE_4( TLE ):
                 "{:>011.8f}".format( self._mm)[:12], 
                 "{:d}".format( self._elset).rjust(4,'0')[-4:]
                 )
-        return L2
+        return L2 + generate_checksum( L2 )
     
     def generateLines( self ):
-        return ( self.generateLine1(), self.generateLine2() )
+        return self._lines()
 
 # -----------------------------------------------------------------------------------------------------
 def demo():
@@ -0,0 +1,307 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# reproducible benchmarks of the hot paths, on seeded synthetic catalogs of 1k / 100k / 1M elsets
+#
+#   python -m PyTLE.bench                                   # all sizes, results as JSON on stdout
+#   python -m PyTLE.bench --sizes 1000 100000 --out now.json
+#   python -m PyTLE.bench --baseline base.json              # non-zero exit if anything regressed
+#   python -m PyTLE.bench --out base.json --save-baseline   # record a new baseline
+#   python -m PyTLE.bench --startup                         # import time : lazy package vs everything eagerly
+#
+# per-object (scalar) benchmarks run on the first `scalar` elsets of each catalog (default 20000) and are
+# reported per operation, so sizes stay comparable; every timing is the best of `repeat` runs
+#
+# timings only compare on the machine (and python / numpy) they were taken on : bench_baseline.json is the
+# baseline of the machine the package was last tuned on, record your own with --save-baseline before using
+# --baseline as a regression gate
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+from . import arrays, formatters
+from .base import TLE
+from .catalog import TLECatalog, TLE_DTYPE
+from .tle_fitter import tle_fitter
+from .utils import julian
+
+SIZES     = ( 1000, 100000, 1000000 )
+SEED      = 20230517
+THRESHOLD = 0.25        # a benchmark regresses when it is more than 25% slower per operation than the baseline
+
+# -----------------------------------------------------------------------------------------------------
+def synthetic_catalog( n, seed=SEED ):
+    ''' n random (but valid, writable) elsets, the same for a given ( n, seed ) '''
+    rng = np.random.default_rng( seed )
+    t4  = rng.random( n ) < 0.2
+    D = np.zeros( n, dtype=TLE_DTYPE )
+    D['satno']   = rng.integers( 1, 340000, n )
+    D['class']   = b'U'
+    D['intld']   = b'98067A'
+    D['epoch']   = np.datetime64( '2000-01-01', 'us' ) + ( rng.integers( 0, 30 * 365 * 10 ** 8, n ) * 864 ).astype( 'timedelta64[us]' )
+    D['type']    = np.where( t4, 4, 0 )
+    D['elset']   = rng.integers( 0, 1000, n )
+    D['ndot']    = np.where( t4, 0., np.round( rng.uniform( -1e-3, 1e-3, n ), 8 ) )
+    D['ndotdot'] = 0.
+    D['bstar']   = np.where( t4, 0., np.round( rng.uniform( 1e-5, 1e-3, n ), 8 ) )
+    D['agom']    = np.where( t4, np.round( rng.uniform( 0.01, 0.1, n ), 6 ), 0. )
+    D['B']       = np.where( t4, np.round( rng.uniform( 0.01, 0.1, n ), 6 ), 0. )
+    D['incl']    = np.round( rng.uniform( 0, 180, n ), 4 )
+    D['raan']    = np.round( rng.uniform( 0, 359, n ), 4 )
+    D['ecc']     = np.round( rng.uniform( 0, 0.2, n ), 7 )
+    D['argp']    = np.round( rng.uniform( 0, 359, n ), 4 )
+    D['ma']      = np.round( rng.uniform( 0, 359, n ), 4 )
+    D['mm']      = np.round( rng.uniform( 1, 16, n ), 8 )
+    D['jd']      = julian.datetime_to_jd( D['epoch'] )
+    return TLECatalog( D )
+
+class _context:
+    ''' inputs shared by the benchmarks of one catalog size (built once, outside the timings) '''
+    def __init__(self, n, scalar, seed=SEED):
+        self.n      = n
+        self.cat    = synthetic_catalog( n, seed )
+        self.text   = self.cat.to_bytes()
+        self.lines  = self.cat[ :scalar ].generateLines()
+        self.m      = len(self.lines)
+        self.tles   = [ TLE.parseLines( L1, L2 ) for L1, L2 in self.lines ]
+        self.fitters = [ tle_fitter( T ) for T in self.tles ]
+        self.arrays  = [ F.to_array() for F in self.fitters ]
+        self.expos   = [ L1[53:61] for L1, L2 in self.lines ]
+        self.floats  = [ T._bstar or T._B for T in self.tles ]
+        self.epochs  = [ L1[18:32] for L1, L2 in self.lines ]
+        self.dts     = [ T._epoch for T in self.tles ]
+        self.jds     = [ julian.to_jd( dt ) for dt in self.dts ]
+        self.epoch_chars = np.frombuffer( self.text, dtype=np.uint8 ).reshape( n, 2, 70 )[:, 0, 18:32].copy().view( 'S14' ).ravel()
+        self.dt64    = self.cat.data['epoch']
+
+        # state vectors : roughly circular orbits, 6700 -- 42000 km, never exactly equatorial
+        rng = np.random.default_rng( seed )
+        r   = rng.uniform( 6700, 42000, n )
+        u   = rng.normal( size=( n, 3 ) ); u /= np.linalg.norm( u, axis=1 )[:, None]
+        w   = np.cross( u, rng.normal( size=( n, 3 ) ) ); w /= np.linalg.norm( w, axis=1 )[:, None]
+        self.P = u * r[:, None]
+        self.V = w * np.sqrt( 398600.5 / r )[:, None]
+        self.V[:, 2] += 1e-3
+        self.pv_epochs = self.dt64
+
+# -----------------------------------------------------------------------------------------------------
+# name -> ( benchmark( ctx ) returning the number of operations, scalar or batch )
+
+def _parse_scalar( c ):
+    for L1, L2 in c.lines: TLE.parseLines( L1, L2 )
+    return c.m
+
+def _generate_scalar( c ):
+    # drop the line cache first : repeats would otherwise only time cache hits
+    for T in c.tles:
+        T._linekey = None
+        T.generateLines()
+    return c.m
+
+def _frompv_scalar( c ):
+    for i in range( c.m ): TLE.fromPV( c.dts[i], c.P[i], c.V[i] )
+    return c.m
+
+def _to_array( c ):
+    for F in c.fitters: F.to_array()
+    return c.m
+
+def _from_array( c ):
+    for F, X in zip( c.fitters, c.arrays ): F.from_array( X )
+    return c.m
+
+def _expo_generate( c ):
+    for x in c.floats: formatters.generate_expo_format( x )
+    return c.m
+
+def _expo_process( c ):
+    for S in c.expos: formatters.process_expo_format( S )
+    return c.m
+
+def _epoch_parse( c ):
+    for S in c.epochs: formatters.epoch_str_todatetime( S )
+    return c.m
+
+def _epoch_format( c ):
+    for dt in c.dts: formatters.datetime_to_epochstr( dt )
+    return c.m
+
+def _to_jd( c ):
+    for dt in c.dts: julian.to_jd( dt )
+    return c.m
+
+def _from_jd( c ):
+    for jd in c.jds: julian.from_jd( jd )
+    return c.m
+
+BENCHMARKS = {
+        'TLE.parseLines'                      : _parse_scalar,
+        'TLE.generateLines'                   : _generate_scalar,
+        'TLE.fromPV'                          : _frompv_scalar,
+        'tle_fitter.to_array'                 : _to_array,
+        'tle_fitter.from_array'               : _from_array,
+        'formatters.generate_expo_format'     : _expo_generate,
+        'formatters.process_expo_format'      : _expo_process,
+        'formatters.epoch_str_todatetime'     : _epoch_parse,
+        'formatters.datetime_to_epochstr'     : _epoch_format,
+        'julian.to_jd'                        : _to_jd,
+        'julian.from_jd'                      : _from_jd,
+        # whole catalog (array) paths
+        'TLECatalog.from_buffer'              : lambda c : len( TLECatalog.from_buffer( c.text ) ),
+        'TLECatalog.to_bytes'                 : lambda c : len( c.cat.to_bytes() ) and c.n,
+        'TLE.fromPV_batch'                    : lambda c : len( TLE.fromPV_batch( c.pv_epochs, c.P, c.V )[1] ),
+        'formatters.epoch_str_to_datetime64'  : lambda c : len( arrays.epoch_str_to_datetime64( c.epoch_chars ) ),
+        'formatters.datetime64_to_epoch_str'  : lambda c : len( arrays.datetime64_to_epoch_str( c.dt64 ) ),
+        'julian.datetime_to_jd'               : lambda c : len( julian.datetime_to_jd( c.dt64 ) ),
+        'julian.jd_to_datetime'               : lambda c : len( julian.jd_to_datetime( c.cat.data['jd'] ) ),
+        }
+
+# -----------------------------------------------------------------------------------------------------
+def run( sizes=SIZES, scalar : int = 20000, repeat : int = 3, only=None, seed=SEED, log=sys.stderr ):
+    ''' run the benchmarks (names containing any of `only`), returns the results document '''
+    results = []
+    for n in sizes:
+        t = time.perf_counter()
+        ctx = _context( n, scalar, seed )
+        if log: print('size {} : inputs built in {:.1f} s'.format( n, time.perf_counter() - t ), file=log)
+        for name, bench in BENCHMARKS.items():
+            if only and not any( o in name for o in only ): continue
+            best = np.inf
+            for _ in range( repeat ):
+                t = time.perf_counter()
+                ops = bench( ctx )
+                best = min( best, time.perf_counter() - t )
+            results.append( { 'name' : name, 'size' : n, 'ops' : int( ops ), 'seconds' : best,
+                              'us_per_op' : 1e6 * best / max( ops, 1 ), 'ops_per_s' : ops / best if best > 0 else None } )
+            if log: print('  {:<40s} {:>9d} ops {:>12.3f} us/op'.format( name, ops, results[-1]['us_per_op'] ), file=log)
+    return { 'meta' : { 'created'  : datetime.now( timezone.utc ).isoformat(),
+                        'python'   : platform.python_version(),
+                        'numpy'    : np.__version__,
+                        'platform' : platform.platform(),
+                        'machine'  : platform.machine(),
+                        'sizes'    : list( sizes ),
+                        'scalar'   : scalar,
+                        'repeat'   : repeat,
+                        'seed'     : seed },
+             'results' : results }
+
+def compare( results, baseline, threshold : float = THRESHOLD ):
+    '''
+    per benchmark ratio to the baseline ( us_per_op now / baseline ) for every ( name, size ) in both
+    returns a list of dicts with a 'regressed' flag (ratio > 1 + threshold)
+    '''
+    base = { ( R['name'], R['size'] ) : R for R in baseline['results'] }
+    out  = []
+    for R in results['results']:
+        B = base.get( ( R['name'], R['size'] ) )
+        if B is None: continue
+        ratio = R['us_per_op'] / B['us_per_op'] if B['us_per_op'] > 0 else np.inf
+        out.append( { 'name' : R['name'], 'size' : R['size'], 'us_per_op' : R['us_per_op'],
+                      'baseline' : B['us_per_op'], 'ratio' : ratio, 'regressed' : ratio > 1 + threshold } )
+    return out
+
+# -----------------------------------------------------------------------------------------------------
+# startup : each case runs in a fresh interpreter, timed from the inside (interpreter start-up excluded)
+
+_STARTUP = {
+        'import'             : 'import PyTLE',
+        'import + parse/gen' : 'import PyTLE\nT = PyTLE.TLE.parseLines( PyTLE.base.gL1, PyTLE.base.gL2 )\nT.generateLines()',
+        'import + catalog'   : 'import PyTLE\nPyTLE.TLECatalog',
+        'eager (everything)' : 'import PyTLE\nfor name in PyTLE.__all__: getattr( PyTLE, name )',
+        }
+
+_STARTUP_CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+{}
+dt = time.perf_counter() - t0
+print( json.dumps( {{ 'ms' : dt * 1e3, 'numpy' : 'numpy' in sys.modules, 'sgp4' : 'sgp4' in sys.modules }} ) )
+"""
+
+def startup( repeat : int = 5, log=sys.stderr ):
+    ''' time `import PyTLE` (and a first parse / catalog) in fresh interpreters, best of `repeat` '''
+    env = dict( os.environ )
+    root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+    env['PYTHONPATH'] = os.pathsep.join( P for P in ( root, env.get( 'PYTHONPATH' ) ) if P )
+    results = []
+    for name, code in _STARTUP.items():
+        runs = [ json.loads( subprocess.run( [ sys.executable, '-c', _STARTUP_CHILD.format( code ) ], env=env,
+                                             check=True, capture_output=True, text=True ).stdout ) for _ in range( repeat ) ]
+        best = min( runs, key=lambda R : R['ms'] )
+        results.append( dict( name=name, **best ) )
+        if log: print('{:<22s} {:>9.2f} ms   numpy: {!s:<5} sgp4: {!s:<5}'.format( name, best['ms'], best['numpy'], best['sgp4'] ), file=log)
+    return { 'python' : platform.python_version(), 'repeat' : repeat, 'startup' : results }
+
+# -----------------------------------------------------------------------------------------------------
+def main( argv=None ):
+    P = argparse.ArgumentParser( prog='python -m PyTLE.bench', description='PyTLE hot path benchmarks' )
+    P.add_argument( '--sizes', type=int, nargs='+', default=list( SIZES ) )
+    P.add_argument( '--scalar', type=int, default=20000, help='elsets used by the per-object benchmarks' )
+    P.add_argument( '--repeat', type=int, default=3 )
+    P.add_argument( '--only', nargs='+', help='run the benchmarks whose name contains any of these' )
+    P.add_argument( '--seed', type=int, default=SEED )
+    P.add_argument( '--out', help='write the results JSON here (default stdout)' )
+    P.add_argument( '--baseline', help='results JSON to compare against' )
+    P.add_argument( '--threshold', type=float, default=THRESHOLD )
+    P.add_argument( '--save-baseline', action='store_true', help='only record the results (no comparison)' )
+    P.add_argument( '--startup', action='store_true', help='only time the package import (see startup)' )
+    A = P.parse_args( argv )
+
+    if A.startup:
+        text = json.dumps( startup( A.repeat ), indent=1 )
+        if A.out:
+            with open( A.out, 'w' ) as F: F.write( text )
+        else: print( text )
+        return 0
+
+    results = run( A.sizes, A.scalar, A.repeat, A.only, A.seed )
+    text = json.dumps( results, indent=1 )
+    if A.out:
+        with open( A.out, 'w' ) as F: F.write( text )
+    else: print( text )
+    if A.save_baseline or not A.baseline: return 0
+
+    with open( A.baseline ) as F: baseline = json.load( F )
+    for key in ( 'platform', 'python', 'numpy' ):
+        if baseline['meta'].get( key ) != results['meta'][key]:
+            print('baseline was recorded with {} {} (this run : {}), ratios are not comparable'.format(
+                  key, baseline['meta'].get( key ), results['meta'][key] ), file=sys.stderr)
+    cmp = compare( results, baseline, A.threshold )
+    bad = [ C for C in cmp if C['regressed'] ]
+    for C in cmp:
+        print('{} {:<40s} {:>9d} {:>12.3f} us/op  x{:.2f}'.format( '!!' if C['regressed'] else '  ', C['name'], C['size'],
+                                                                  C['us_per_op'], C['ratio'] ), file=sys.stderr)
+    print('{} of {} benchmarks regressed by more than {:.0%}'.format( len(bad), len(cmp), A.threshold ), file=sys.stderr)
+    return 1 if bad else 0
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,160 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# binary on-disk form of a parsed TLECatalog, reloaded with np.memmap (no parsing, pages shared between
+# processes through the page cache)
+#
+#   bytes 0 -- 8   : magic b'PYTLECAT'
+#   bytes 8 -- 16  : header length (uint64, little endian)
+#   header         : JSON { version, dtype (TLE_DTYPE.descr), count, validate, source { path, size, mtime_ns } }
+#   rows           : the TLE_DTYPE array as is, starting at the next multiple of _ALIGN
+#
+# a cache records the size / mtime of the text file it was parsed from and counts as stale once that changes
+# (or when the format version / row layout is not the one of this code, or it was parsed with another validate flag)
+
+import json
+import os
+import unittest
+import numpy as np
+
+from .catalog import TLECatalog, TLE_DTYPE, _synthetic_elsets
+
+CACHE_VERSION = 2
+_MAGIC = b'PYTLECAT'
+_ALIGN = 64
+
+# -----------------------------------------------------------------------------------------------------
+def _stat( source ):
+    st = os.stat( source )
+    return { 'path' : os.path.abspath( source ), 'size' : st.st_size, 'mtime_ns' : st.st_mtime_ns }
+
+def _descr( dtype ):
+    ''' dtype description as JSON gives it back (lists, not tuples) '''
+    return json.loads( json.dumps( dtype.descr ) )
+
+def save_catalog( catalog, path, source=None, validate : bool = False ):
+    '''
+    write catalog to path (atomically : a temporary file is renamed into place)
+    source   : the text file the catalog was parsed from, to invalidate the cache when it changes
+    validate : whether the corrupt records of source were dropped when parsing it
+    '''
+    header = json.dumps( { 'version'  : CACHE_VERSION,
+                           'dtype'    : _descr( TLE_DTYPE ),
+                           'count'    : len(catalog),
+                           'validate' : bool( validate ),
+                           'source'   : _stat( source ) if source is not None else None } ).encode()
+    start = -( -( 16 + len(header) ) // _ALIGN ) * _ALIGN
+    tmp = '{}.{}.tmp'.format( path, os.getpid() )
+    with open( tmp, 'wb' ) as F:
+        F.write( _MAGIC )
+        F.write( np.uint64( len(header) ).tobytes() )
+        F.write( header.ljust( start - 16 ) )
+        np.ascontiguousarray( catalog.data, dtype=TLE_DTYPE ).tofile( F )
+    os.replace( tmp, path )
+
+def read_header( path ):
+    ''' ( header dict, byte offset of the rows ), or ( None, 0 ) if path is not a catalog cache '''
+    try:
+        with open( path, 'rb' ) as F:
+            if F.read( 8 ) != _MAGIC: return None, 0
+            n = int( np.frombuffer( F.read( 8 ), dtype='<u8' )[0] )
+            header = json.loads( F.read( n ) )
+    except ( OSError, ValueError, IndexError ): return None, 0
+    return header, -( -( 16 + n ) // _ALIGN ) * _ALIGN
+
+def is_stale( path, source=None, validate=None ):
+    '''
+    True if path is missing, unreadable, from another format version, older than source, or (validate not None)
+    parsed with the other validate flag
+    '''
+    header, _ = read_header( path )
+    if header is None or header.get( 'version' ) != CACHE_VERSION or header.get( 'dtype' ) != _descr( TLE_DTYPE ): return True
+    if validate is not None and header.get( 'validate' ) != bool( validate ): return True
+    if source is None: return False
+    try: now = _stat( source )
+    except OSError: return True
+    was = header.get( 'source' ) or {}
+    return was.get( 'size' ) != now['size'] or was.get( 'mtime_ns' ) != now['mtime_ns']
+
+def load_catalog( path, mode : str = 'r' ):
+    '''
+    memory-mapped TLECatalog from a cache file (nothing is read until rows / columns are touched)
+    mode : np.memmap mode, 'r' read-only (default), 'c' copy-on-write, 'r+' write through to the file
+    '''
+    header, offset = read_header( path )
+    if header is None: raise Exception('{} is not a catalog cache'.format( path ))
+    if header['version'] != CACHE_VERSION or header['dtype'] != _descr( TLE_DTYPE ):
+        raise Exception('{} : cache format {} does not match this version ({})'.format( path, header['version'], CACHE_VERSION ))
+    if header['count'] == 0: return TLECatalog()
+    return TLECatalog( np.memmap( path, dtype=TLE_DTYPE, mode=mode, offset=offset, shape=( header['count'], ) ) )
+
+def cached_catalog( source, cache=None, validate : bool = False, mode : str = 'r' ):
+    '''
+    TLECatalog of a 2LE / 3LE text file, parsed once and memory-mapped from the binary cache afterwards
+    cache defaults to source + '.tlecache'; it is rebuilt whenever the source file changes or validate differs
+    from the flag it was built with
+    '''
+    if cache is None: cache = str( source ) + '.tlecache'
+    if is_stale( cache, source, validate ):
+        before = _stat( source )
+        cat = TLECatalog.from_file( source, validate )
+        # only keep the cache if the file did not change while it was being parsed
+        if _stat( source ) == before: save_catalog( cat, cache, source, validate )
+        else: return cat
+    return load_catalog( cache, mode )
+
+# -----------------------------------------------------------------------------------------------------
+class TestingCatalogCache( unittest.TestCase ):
+    @classmethod
+    def setUpClass(self):
+        import tempfile
+        self._dir = tempfile.TemporaryDirectory()
+        lines = [ L for T in _synthetic_elsets( 3000 ) for L in T.generateLines() ]
+        lines[ 2 * 1234 + 1 ] = lines[ 2 * 1234 + 1 ][:-1] + str( ( int( lines[ 2 * 1234 + 1 ][-1] ) + 1 ) % 10 )
+        self._text = ( '\n'.join( lines ) + '\n' ).encode()
+        self._path = os.path.join( self._dir.name, 'feed.tle' )
+        with open( self._path, 'wb' ) as F: F.write( self._text )
+
+    @classmethod
+    def tearDownClass(self):
+        self._dir.cleanup()
+
+    def _check( self, first, second ):
+        cache = self._path + '.{}{}'.format( int(first), int(second) )
+        cached_catalog( self._path, cache, validate=first )
+        cat = cached_catalog( self._path, cache, validate=second )
+        ref = TLECatalog.from_buffer( self._text, validate=second )
+        self.assertEqual( len(cat), len(ref) )
+        self.assertTrue( np.array_equal( np.asarray( cat.data ), ref.data ) )
+
+    def test_validate_flag(self):
+        self.assertEqual( len( self._text.splitlines() ), 2 * 3006 )
+        for first in ( False, True ):
+            for second in ( False, True ):
+                self._check( first, second )
+
+# # =====================================================================================================
+if __name__ == '__main__' :
+    unittest.main()
@@ -0,0 +1,492 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+from datetime import datetime, timedelta
+import unittest
+import numpy as np
+
+from .arrays import alpha_to_integer_array, epoch_parts_to_datetime64
+from . import orbit
+from .base import TLE, TLE_2, TLE_4
+from .utils import julian
+
+# one row per elset; field names follow the TLE data members (TLE._incl -> 'incl', etc)
+TLE_DTYPE = np.dtype([
+        ('satno',   'i4'),
+        ('class',   'S1'),
+        ('intld',   'S8'),
+        ('epoch',   'datetime64[us]'),
+        ('jd',      'f8'),
+        ('ndot',    'f8'),
+        ('ndotdot', 'f8'),
+        ('bstar',   'f8'),
+        ('B',       'f8'),
+        ('agom',    'f8'),
+        ('type',    'i1'),      # 0 for type 0 / 2 elsets (what TLE_2._type holds), 4 for type 4
+        ('elset',   'i4'),
+        ('incl',    'f8'),
+        ('raan',    'f8'),
+        ('ecc',     'f8'),
+        ('argp',    'f8'),
+        ('ma',      'f8'),
+        ('mm',      'f8'),
+        ('name',    'S24'),
+        ])
+
+# columns derived from mean motion / eccentricity (TLECatalog.derived, orbit.shells / orbit.regime)
+DERIVED_DTYPE = np.dtype([
+        ('sma',     'f8'),      # km
+        ('perigee', 'f8'),      # km altitude
+        ('apogee',  'f8'),      # km altitude
+        ('period',  'f8'),      # minutes
+        ('regime',  'i1'),      # orbit.REGIME_*
+        ])
+
+LINE_LEN      = 69
+NAME_LEN      = 24
+
+# 10 ** exponent for the single digit exponent of the "00000-0" fields (python's own pow, to match process_expo_format)
+_POW10 = np.array( [ 10 ** e for e in range(-9, 10) ], dtype=np.float64 )
+
+# -----------------------------------------------------------------------------------------------------
+def _frame( buf ):
+    '''
+    find line 1 / line 2 records in a text buffer (bytes, mmap or uint8 array) without a python loop per line
+    blank lines and anything that is not a 1/2 pair are skipped; a line just before a line 1 that is
+    not itself part of a record is taken as the name line (3LE, with or without the "0 " prefix)
+    returns a dict of per record arrays:
+        s1, n1 / s2, n2 / sn, nn : byte offset and (CR stripped) length of line 1 / line 2 / name (nn = 0 if none)
+        start, end               : byte span of the whole record (end is just past the line 2 newline)
+        term                     : line 2 was newline terminated (False only for a last, unterminated line)
+    '''
+    B = np.frombuffer( buf, dtype=np.uint8 )
+    nl = np.flatnonzero( B == ord('\n') )
+    starts = np.concatenate( ( [0], nl + 1 ) )
+    ends   = np.concatenate( ( nl, [len(B)] ) )
+    nexts  = np.concatenate( ( nl + 1, [len(B)] ) )
+    term   = np.concatenate( ( np.ones( len(nl), dtype=bool ), [False] ) )
+    last   = B[ np.clip( ends - 1, 0, None ) ] if len(B) else np.zeros( len(ends), dtype=np.uint8 )
+    ends   = ends - ( ( ends > starts ) & ( last == ord('\r') ) )
+    keep   = ends > starts
+    starts, ends, nexts, term = starts[keep], ends[keep], nexts[keep], term[keep]
+    first  = B[ starts ]
+    second = B[ np.minimum( starts + 1, max( len(B) - 1, 0 ) ) ]
+    rec    = np.flatnonzero( ( first[:-1] == ord('1') ) & ( first[1:] == ord('2') ) )
+
+    # name lines: the line before a line 1, unless it is the line 2 of the previous record or looks like a TLE line
+    prev    = rec - 1
+    tleline = ( ( first == ord('1') ) | ( first == ord('2') ) ) & ( second == ord(' ') )
+    isname  = ( prev >= 0 ) & ~np.isin( prev, rec + 1 )
+    isname[ isname ] &= ~tleline[ prev[isname] ]
+    sn = np.where( isname, starts[ prev ], starts[ rec ] )
+    nn = np.where( isname, ends[ prev ] - starts[ prev ], 0 )
+    # strip the "0 " prefix used by 3LE files
+    zero = ( nn > 1 ) & ( B[ sn ] == ord('0') ) & ( B[ np.minimum( sn + 1, len(B) - 1 ) ] == ord(' ') )
+    sn, nn = sn + 2 * zero, nn - 2 * zero
+
+    return { 's1' : starts[rec],   'n1' : ends[rec] - starts[rec],
+             's2' : starts[rec+1], 'n2' : ends[rec+1] - starts[rec+1],
+             'sn' : sn,            'nn' : nn,
+             'start' : np.where( isname, starts[ prev ], starts[rec] ),
+             'end'   : nexts[rec+1],
+             'term'  : term[rec+1] }
+
+def _gather( buf, starts, lengths, width=LINE_LEN, pad=ord(' ') ):
+    ''' copy lines out of a text buffer into an (N, width) uint8 array (short lines are padded) '''
+    B = np.frombuffer( buf, dtype=np.uint8 )
+    if len(starts) == 0: return np.zeros( (0, width), dtype=np.uint8 )
+    cols = np.arange( width )
+    A = np.take( B, starts[:, None] + cols, mode='clip' )
+    short = np.flatnonzero( lengths < width )
+    if len(short):
+        A[ short ] = np.where( cols < lengths[short, None], A[ short ], pad )
+    return A
+
+def _names( buf, starts, lengths ):
+    ''' name lines as a fixed-width bytes array (trailing blanks removed) '''
+    A = _gather( buf, starts, lengths, width=NAME_LEN, pad=0 )
+    return np.char.rstrip( A.view( 'S{}'.format(NAME_LEN) ).ravel() )
+
+def _text( A, start, stop ):
+    ''' columns [start, stop) of every line as a fixed-width bytes array '''
+    return np.ascontiguousarray( A[:, start:stop] ).view( 'S{}'.format(stop-start) ).ravel()
+
+# ( start, stop, decimal point column ) of the numeric fields on each line
+_FIELDS1 = {
+        'year'    : ( 18, 20, None ),
+        'day'     : ( 20, 23, None ),
+        'dayfrac' : ( 24, 32, None ),
+        'ndot'    : ( 33, 43, 34 ),
+        'mant44'  : ( 44, 50, None ),
+        'expo44'  : ( 50, 52, None ),
+        'mant53'  : ( 53, 59, None ),
+        'expo53'  : ( 59, 61, None ),
+        'type'    : ( 62, 63, None ),
+        'elset'   : ( 64, 68, None ),
+        }
+
+_FIELDS2 = {
+        'incl'    : ( 8, 16, 11 ),
+        'raan'    : ( 17, 25, 20 ),
+        'ecc'     : ( 26, 33, None ),
+        'argp'    : ( 34, 42, 37 ),
+        'ma'      : ( 43, 51, 46 ),
+        'mm'      : ( 52, 63, 54 ),
+        }
+
+def _weights( fields, limb=7 ):
+    '''
+    place-value matrices for a field spec; every field is split into limbs of at most 7 digits so that the
+    float32 products stay exact (< 2**24), and the limbs are recombined in float64
+    returns W (69, L) limb weights, S (L, K) limb scales, M (69, K) column membership
+    '''
+    W, S, M = [], [], np.zeros( ( LINE_LEN, len(fields) ), dtype=np.float32 )
+    for k, ( start, stop, point ) in enumerate( fields.values() ):
+        M[start:stop, k] = 1.
+        cols = [ c for c in range( stop-1, start-1, -1 ) if c != point ]
+        for j in range( 0, len(cols), limb ):
+            w = np.zeros( LINE_LEN, dtype=np.float32 )
+            for p, c in enumerate( cols[j:j+limb] ): w[c] = 10. ** p
+            W.append( w )
+            S.append( ( k, 10. ** j ) )
+    scale = np.zeros( ( len(S), len(fields) ) )
+    for l, ( k, sc ) in enumerate( S ): scale[l, k] = sc
+    return np.array( W ).T.copy(), scale, M
+
+_W1, _S1, _M1 = _weights( _FIELDS1 )
+_W2, _S2, _M2 = _weights( _FIELDS2 )
+
+# character --> digit value / character --> class ( 1 for a minus sign, 1000 for anything but digit, blank, sign or point )
+_DIGIT_LUT = np.zeros( 256, dtype=np.float32 )
+_DIGIT_LUT[ ord('0'):ord('9')+1 ] = np.arange( 10 )
+_CLASS_LUT = np.full( 256, 1000., dtype=np.float32 )
+_CLASS_LUT[ [ ord(c) for c in '0123456789 +.' ] ] = 0.
+_CLASS_LUT[ ord('-') ] = 1.
+
+def _decode( A, fields, W, S, M, block=65536 ):
+    '''
+    digits of every field in one pass: each block of lines goes through two table lookups and two
+    (N, 69) x (69, K) products instead of a python loop per line
+    returns { field : (digits, has a minus sign, has a character that is not digit/blank/sign/point) }
+    '''
+    V = np.empty( ( len(A), len(fields) ) )
+    C = np.empty( ( len(A), len(fields) ), dtype=np.float32 )
+    for i in range( 0, len(A), block ):
+        B = A[i:i+block]
+        V[i:i+block] = ( np.take( _DIGIT_LUT, B ) @ W ).astype( np.float64 ) @ S
+        C[i:i+block] = np.take( _CLASS_LUT, B ) @ M
+    # (a minus sign is only meaningful on rows without junk, and those rows are re-parsed anyway)
+    NEG, BAD = C > 0, C >= 1000
+    return { name : ( V[:, k], NEG[:, k], BAD[:, k] ) for k, name in enumerate(fields) }
+
+def _float( A, fields, F, name ):
+    '''
+    fixed point field: digits / 10**k is exactly what float() gives for these short strings,
+    so this matches the per-object parse; anything off-layout goes through numpy's string conversion
+    '''
+    start, stop, point = fields[ name ]
+    digits, neg, bad = F[ name ]
+    val = np.where( neg, -digits, digits ) / 10. ** ( stop - point - 1 )
+    off = np.flatnonzero( bad | ( A[:, point] != ord('.') ) )
+    if len(off): val[ off ] = _text( A[ off ], start, stop ).astype( np.float64 )
+    return val
+
+def _expo( F, mant, expo ):
+    ''' vectorized process_expo_format from the mantissa / exponent halves of the "00000-0" field '''
+    m, mneg, _ = F[ mant ]
+    e, eneg, _ = F[ expo ]
+    e = np.where( eneg, -e, e ).astype( np.int64 )
+    return np.where( mneg, -1., 1. ) * ( m / 1e5 ) * _POW10[ e + 9 ]
+
+def _epoch( F ):
+    ''' YYDDD.DDDDDDDD --> datetime64[us], same convention as epoch_str_todatetime '''
+    return epoch_parts_to_datetime64( F['year'][0], F['day'][0], F['dayfrac'][0], unit='us' )
+
+def _type( T ):
+    ''' type column : type 2 elsets are stored as 0, the way TLE_2 objects carry them '''
+    return np.where( T == 2, 0, T )
+
+def _satno( A ):
+    ''' alpha-5 aware satno column of every line '''
+    satno, bad = alpha_to_integer_array( A[:, 2:7] )
+    if np.any( bad ): raise Exception('invalid satno in {} records'.format( np.sum(bad) ))
+    return satno
+
+# -----------------------------------------------------------------------------------------------------
+class TLECatalog:
+    '''
+    columnar store for many elsets at once; fields live in a numpy structured array (TLE_DTYPE)
+    individual rows are handed back as TLE_2 / TLE_4 objects on demand
+    '''
+    def __init__(self, data=None):
+        if data is None: data = np.zeros( 0, dtype=TLE_DTYPE )
+        self.data = data
+        self._derived = None
+
+    @staticmethod
+    def from_arrays( A1, A2 ):
+        ''' A1, A2 : (N, 69) uint8 arrays of line 1 / line 2 '''
+        N = A1.shape[0]
+        if np.any( A1[:, 0] != ord('1') ) : raise Exception('LINE1 must begin with 1')
+        if np.any( A2[:, 0] != ord('2') ) : raise Exception('LINE2 must begin with 2')
+
+        F1 = _decode( A1, _FIELDS1, _W1, _S1, _M1 )
+        F2 = _decode( A2, _FIELDS2, _W2, _S2, _M2 )
+
+        data = np.zeros( N, dtype=TLE_DTYPE )
+        data['satno'] = _satno( A1 )
+        if np.any( _satno( A2 ) != data['satno'] ): raise Exception('satno does not match')
+        data['class'] = _text( A1, 7, 8 )
+        data['intld'] = _text( A1, 9, 17 )
+        data['epoch'] = _epoch( F1 )
+        data['jd']    = julian.datetime_to_jd( data['epoch'] )
+        data['type']  = _type( F1['type'][0] )
+        data['elset'] = F1['elset'][0]
+
+        # columns 44 and 53 are ndotdot / bstar for type 0/2 and agom / B for type 4
+        t4 = data['type'] == 4
+        col44, col53 = _expo( F1, 'mant44', 'expo44' ), _expo( F1, 'mant53', 'expo53' )
+        data['ndot']    = np.where( t4, 0., _float( A1, _FIELDS1, F1, 'ndot' ) )
+        data['ndotdot'] = np.where( t4, 0., col44 )
+        data['bstar']   = np.where( t4, 0., col53 )
+        data['agom']    = np.where( t4, col44, 0. )
+        data['B']       = np.where( t4, col53, 0. )
+
+        data['incl'] = _float( A2, _FIELDS2, F2, 'incl' )
+        data['raan'] = _float( A2, _FIELDS2, F2, 'raan' )
+        data['ecc']  = F2['ecc'][0] / 1e7
+        data['argp'] = _float( A2, _FIELDS2, F2, 'argp' )
+        data['ma']   = _float( A2, _FIELDS2, F2, 'ma' )
+        data['mm']   = _float( A2, _FIELDS2, F2, 'mm' )
+        return TLECatalog( data )
+
+    @staticmethod
+    def from_tles( tles ):
+        ''' columnar copy of a list of TLE_2 / TLE_4 objects '''
+        data = np.zeros( len(tles), dtype=TLE_DTYPE )
+        for field in ( 'satno', 'class', 'intld', 'epoch', 'ndot', 'ndotdot', 'bstar', 'B', 'agom',
+                       'type', 'elset', 'incl', 'raan', 'ecc', 'argp', 'ma', 'mm' ):
+            data[field] = [ getattr( T, '_' + field ) for T in tles ]
+        data['type'] = _type( data['type'] )
+        data['jd'] = julian.datetime_to_jd( data['epoch'] )
+        return TLECatalog( data )
+
+    @staticmethod
+    def from_buffer( buf, validate : bool = False ):
+        '''
+        buf : bytes (or mmap / uint8 array) of 2LE or 3LE text
+        validate=True drops the records failing validate.validate_arrays (checksums, layout, satno agreement)
+        '''
+        return TLECatalog._from_frame( buf, _frame( buf ), validate=validate )
+
+    @staticmethod
+    def _from_frame( buf, fr, sel=slice(None), validate : bool = False ):
+        ''' build a catalog from the (optionally selected) records found by _frame '''
+        A1 = _gather( buf, fr['s1'][sel], fr['n1'][sel] )
+        A2 = _gather( buf, fr['s2'][sel], fr['n2'][sel] )
+        sn, nn = fr['sn'][sel], fr['nn'][sel]
+        if validate:
+            from .validate import validate_arrays
+            ok, _ = validate_arrays( A1, A2, fr['n1'][sel], fr['n2'][sel] )
+            A1, A2, sn, nn = A1[ok], A2[ok], sn[ok], nn[ok]
+        cat = TLECatalog.from_arrays( A1, A2 )
+        cat.data['name'] = _names( buf, sn, nn )
+        return cat
+
+    @staticmethod
+    def from_lines( lines, validate : bool = False ):
+        ''' lines : iterable of str (or bytes); name lines and blank lines are skipped '''
+        lines = list( lines )
+        if len(lines) and isinstance( lines[0], str ):
+            return TLECatalog.from_buffer( '\n'.join( lines ).encode( 'ascii', 'replace' ), validate )
+        return TLECatalog.from_buffer( b'\n'.join( lines ), validate )
+
+    @staticmethod
+    def from_file( path, validate : bool = False ):
+        with open( path, 'rb' ) as F:
+            return TLECatalog.from_buffer( F.read(), validate )
+
+    def get_tle( self, i ):
+        ''' build a TLE_2 / TLE_4 for row i (None for unsupported types, like TLE.parseLines) '''
+        row = self.data[i]
+        if row['type'] == 4   : tle = TLE_4()
+        elif row['type'] in (0, 2) : tle = TLE_2()
+        else : return None
+        tle._satno   = int( row['satno'] )
+        tle._class   = row['class'].decode()
+        tle._intld   = row['intld'].decode()
+        tle._epoch   = row['epoch'].item()
+        tle._ndot    = float( row['ndot'] )
+        tle._ndotdot = float( row['ndotdot'] )
+        tle._bstar   = float( row['bstar'] )
+        tle._B       = float( row['B'] )
+        tle._agom    = float( row['agom'] )
+        tle._elset   = int( row['elset'] )
+        tle._incl    = float( row['incl'] )
+        tle._raan    = float( row['raan'] )
+        tle._ecc     = float( row['ecc'] )
+        tle._argp    = float( row['argp'] )
+        tle._ma      = float( row['ma'] )
+        tle._mm      = float( row['mm'] )
+        return tle
+
+    def tles( self ):
+        return [ self.get_tle(i) for i in range(len(self)) ]
+
+    def satrecs( self ):
+        '''
+        sgp4 SatrecArray (WGS72) initialized straight from the columns, no line formatting / parsing
+        (sgp4 has no type 4 model : those rows are initialized with bstar = 0)
+        '''
+        from sgp4.api import SatrecArray
+        from .propagator import satrec_from_elements
+        D = self.data
+        cols = zip( D['satno'].tolist(), D['jd'].tolist(), D['bstar'].tolist(), D['ndot'].tolist(), D['ndotdot'].tolist(),
+                    D['ecc'].tolist(), D['argp'].tolist(), D['incl'].tolist(), D['ma'].tolist(), D['mm'].tolist(), D['raan'].tolist() )
+        return SatrecArray( [ satrec_from_elements( *row ) for row in cols ] )
+
+    def propagate( self, times, out=None, errors=None, budget : int = 1 << 28 ):
+        ''' ( (N, T, 6) TEME states, (N, T) sgp4 error codes ) of every row on a common time grid, see propagator.propagate_catalog '''
+        from .propagator import propagate_catalog
+        return propagate_catalog( self, times, out, errors, budget )
+
+    @property
+    def derived( self ):
+        '''
+        DERIVED_DTYPE array (semi-major axis, perigee, apogee, period, regime), computed for all rows in one
+        vectorized pass and kept until self.data is replaced (call invalidate() after editing rows in place)
+        '''
+        if self._derived is None or self._derived[0] is not self.data:
+            D   = self.data
+            out = np.zeros( len(D), dtype=DERIVED_DTYPE )
+            out['sma'], out['perigee'], out['apogee'], out['period'] = orbit.shells( D['mm'], D['ecc'] )
+            out['regime'] = orbit.regime( D['mm'], D['ecc'], out['perigee'], out['apogee'] )
+            self._derived = ( self.data, out )
+        return self._derived[1]
+
+    def invalidate( self ):
+        ''' drop the cached derived columns '''
+        self._derived = None
+
+    def shell_overlaps( self, margin : float = 0. ):
+        ''' row pairs ( i, j ) whose perigee -- apogee shells (padded by margin km) overlap, see orbit.shell_overlaps '''
+        D = self.derived
+        return orbit.shell_overlaps( D['perigee'], D['apogee'], margin )
+
+    def generateLines( self ):
+        ''' [ (line1, line2), ... ] for every row, through the vectorized writer '''
+        from .writer import generate_lines
+        return generate_lines( self )
+
+    def to_bytes( self ):
+        ''' the whole catalog as 2LE text '''
+        from .writer import generate_bytes
+        return generate_bytes( self )
+
+    def write( self, path ):
+        with open( path, 'wb' ) as F: F.write( self.to_bytes() )
+
+    def __len__( self ): return len( self.data )
+
+    def __iter__( self ):
+        for i in range(len(self)): yield self.get_tle(i)
+
+    def __getitem__( self, key ):
+        ''' int -> TLE object, str -> column (derived ones too), anything else (slice/mask/index array) -> sub-catalog '''
+        if isinstance( key, (int, np.integer) ): return self.get_tle( key )
+        if isinstance( key, str ):
+            return self.derived[ key ] if key in DERIVED_DTYPE.names else self.data[ key ]
+        return TLECatalog( self.data[ key ] )
+
+    @staticmethod
+    def concatenate( catalogs ):
+        return TLECatalog( np.concatenate( [ C.data for C in catalogs ] ) if len(catalogs) else None )
+
+    def __repr__( self ): return 'TLECatalog({} elsets)'.format( len(self) )
+
+# -----------------------------------------------------------------------------------------------------
+def _synthetic_elsets( n, seed=0 ):
+    '''
+    n random TLE_2 / TLE_4 objects (seeded) followed by the awkward rows : alpha-5 satnos, negative ndot,
+    1957 epochs and values that round up into the next digit (or epoch year) when formatted
+    '''
+    rng = np.random.default_rng( seed )
+    kinds = [ TLE_4 if X < 0.25 else TLE_2 for X in rng.random( n ) ] + [ TLE_2, TLE_2, TLE_2, TLE_4, TLE_2, TLE_4 ]
+    tles = []
+    for kind in kinds:
+        T = kind()
+        T._satno = int( rng.integers( 1, 340000 ) )
+        T._class = 'U'
+        T._intld = '98067A'
+        T._epoch = datetime( 1957, 1, 1 ) + timedelta( microseconds=int( rng.integers( 0, 99 * 365 * 86400 * 10 ** 6 ) ) )
+        T._elset = int( rng.integers( 0, 1000 ) )
+        T._ndot, T._ndotdot, T._bstar = round( rng.uniform( -1e-3, 1e-3 ), 8 ), 0., rng.uniform( -1e-3, 1e-3 )
+        T._agom, T._B = rng.uniform( 0, 0.1 ), rng.uniform( 0, 0.1 )
+        T._incl, T._raan, T._argp, T._ma = rng.uniform( 0, 180 ), rng.uniform( 0, 360 ), rng.uniform( 0, 360 ), rng.uniform( 0, 360 )
+        T._ecc, T._mm = rng.uniform( 0, 0.9 ), rng.uniform( 1, 16 )
+        tles.append( T )
+    edge = tles[n:]
+    edge[0]._satno, edge[1]._satno = 100000, 339999
+    edge[0]._ndot, edge[1]._ndot = -0.00001234, -0.5
+    edge[2]._epoch = datetime( 1957, 10, 4, 19, 28, 34 )
+    edge[3]._raan, edge[3]._argp, edge[3]._ma, edge[3]._incl, edge[3]._agom = 359.99995, 99.99995, 9.99995, 179.99999, 9.99996e-3
+    edge[4]._ecc, edge[4]._mm, edge[4]._bstar, edge[4]._ndot = 0.99999995, 9.999999995, 9.99996e-3, 0.000000005
+    edge[5]._B, edge[5]._epoch = -9.99995e-5, datetime( 2023, 12, 31, 23, 59, 59, 999999 )
+    return tles
+
+class TestingCatalogParse( unittest.TestCase ):
+    @classmethod
+    def setUpClass(self):
+        self._lines = [ T.generateLines() for T in _synthetic_elsets( 5000, seed=1 ) ]
+
+    def _compare( self, cat ):
+        ref = TLECatalog.from_tles( [ TLE.parseLines( L1, L2 ) for L1, L2 in self._lines ] ).data
+        self.assertEqual( len(cat), len(ref) )
+        for field in ref.dtype.names:
+            if field == 'name': continue
+            same = cat.data[field] == ref[field]
+            self.assertTrue( np.all( same ), '{} differs in {} records, first at {}'.format( field, np.sum( ~same ), self._lines[ np.argmin( same ) ] ) )
+
+    def test_from_lines(self):
+        self._compare( TLECatalog.from_lines( [ L for pair in self._lines for L in pair ] ) )
+
+    def test_type_column(self):
+        # a type 2 line parses to the type 0 TLE_2 / row that from_tles gives for the same elset
+        from .formatters import generate_checksum
+        L1, L2 = next( pair for pair in self._lines if pair[0][62] == '0' )
+        L1 = L1[:62] + '2' + L1[63:68]
+        L1 += generate_checksum( L1 )
+        cat = TLECatalog.from_lines( [ L1, L2 ] )
+        self.assertEqual( cat.data['type'][0], 0 )
+        self.assertEqual( cat.data.tobytes(), TLECatalog.from_tles( [ cat.get_tle( 0 ) ] ).data.tobytes() )
+
+    def test_from_buffer(self):
+        text = ''.join( 'OBJECT {}\n{}\n{}\n'.format( i, L1, L2 ) for i, ( L1, L2 ) in enumerate( self._lines ) ).encode()
+        cat = TLECatalog.from_buffer( text )
+        self._compare( cat )
+        self.assertEqual( cat.data['name'][-1], 'OBJECT {}'.format( len(self._lines) - 1 ).encode() )
+
+# # =====================================================================================================
+if __name__ == '__main__' :
+    unittest.main()
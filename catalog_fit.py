@@ -0,0 +1,134 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+# catalog level ephemeris fitting : thousands of independent fit_ephemeris problems fanned out over a process pool
+# all ephemerides are packed into three flat arrays (jd, day fraction, states) that live in shared memory,
+# workers attach to them once and only receive index chunks (plus the small initial-guess rows) per task
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from .catalog import TLECatalog, TLE_DTYPE
+from .tle_fitter import fit_ephemeris, split_jd, FIT_ERROR
+
+# per object outcome, next to the fitted catalog
+FIT_INFO_DTYPE = np.dtype( [
+        ('status',     'i1'),       # tle_fitter.FIT_* code
+        ('rms',        'f8'),       # km
+        ('iterations', 'i4'),
+        ('nfev',       'i4'),
+        ('elapsed',    'f8'),       # seconds
+        ] )
+
+# -----------------------------------------------------------------------------------------------------
+def pack_ephemerides( ephemerides ):
+    ''' [ (times, states), ... ] --> flat jd, fraction, (M, 6) states and the (K+1) offsets of every object '''
+    jds, frs, states, offsets = [], [], [], [0]
+    for times, S in ephemerides:
+        jd, fr = split_jd( times )
+        jds.append( jd ); frs.append( fr ); states.append( np.asarray( S, dtype=float ).reshape( -1, 6 ) )
+        offsets.append( offsets[-1] + len(jd) )
+    return ( np.concatenate( jds ), np.concatenate( frs ), np.concatenate( states ),
+             np.array( offsets, dtype=np.int64 ) )
+
+def _share( arrays ):
+    ''' copy arrays into new shared memory blocks : ( blocks, [ (name, shape, dtype) ] ) '''
+    blocks, specs = [], []
+    for A in arrays:
+        shm = shared_memory.SharedMemory( create=True, size=max( A.nbytes, 1 ) )
+        np.ndarray( A.shape, dtype=A.dtype, buffer=shm.buf )[...] = A
+        blocks.append( shm )
+        specs.append( ( shm.name, A.shape, A.dtype.str ) )
+    return blocks, specs
+
+# worker side : the attached blocks and the array views on them
+_WORKER = {}
+
+def _attach( specs ):
+    blocks = [ shared_memory.SharedMemory( name=name ) for name, shape, dtype in specs ]
+    _WORKER['blocks'] = blocks
+    _WORKER['arrays'] = [ np.ndarray( shape, dtype=dtype, buffer=shm.buf )
+                          for shm, ( name, shape, dtype ) in zip( blocks, specs ) ]
+
+def _fit_chunk( idx, guesses, fields, timeout, kwargs, arrays=None ):
+    ''' fit the objects idx (guesses : matching TLE_DTYPE rows or None) --> ( idx, fitted rows, info rows ) '''
+    jd, fr, states, offsets = arrays if arrays is not None else _WORKER['arrays']
+    rows = np.zeros( len(idx), dtype=TLE_DTYPE )
+    info = np.zeros( len(idx), dtype=FIT_INFO_DTYPE )
+    for j, i in enumerate( idx ):
+        a, b  = offsets[i], offsets[i+1]
+        guess = TLECatalog( guesses[j:j+1] ).get_tle( 0 ) if guesses is not None else None
+        try:
+            res = fit_ephemeris( jd[a:b], states[a:b], fields=fields, guess=guess, budget=timeout, fr=fr[a:b], **kwargs )
+            rows[j] = TLECatalog.from_tles( [ res.tle ] ).data[0]
+            info[j] = ( res.status, res.rms, res.iterations, res.nfev, res.elapsed )
+        except Exception:
+            # one bad object must not take the whole chunk down
+            if guesses is not None: rows[j] = guesses[j]
+            info[j] = ( FIT_ERROR, np.inf, 0, 0, 0. )
+    return idx, rows, info
+
+# -----------------------------------------------------------------------------------------------------
+def fit_catalog( ephemerides, guesses : TLECatalog = None, satnos=None, fields=None,
+                 workers : int = None, chunk : int = 16, timeout : float = None, **kwargs ):
+    '''
+    fit every object of a catalog to its own TEME ephemeris, in parallel
+    ephemerides : [ (times, states), ... ] as for fit_ephemeris, one per object
+    guesses     : optional TLECatalog of initial guesses (one row per object, default : fromPV of the first state)
+    satnos      : optional satellite numbers for the fitted elsets (default : the guesses', or 99999)
+    workers     : processes (default : all cores, 1 runs in this process), chunk : objects per task
+    timeout     : per object wall time budget (seconds), a fit that runs out keeps its best iterate (FIT_TIMEOUT)
+    kwargs      : passed on to fit_ephemeris
+    returns ( TLECatalog of the fitted elsets, FIT_INFO_DTYPE array of per object status / rms / iterations )
+    '''
+    arrays = pack_ephemerides( ephemerides )
+    K      = len( arrays[3] ) - 1
+    gdata  = guesses.data if guesses is not None else None
+    if gdata is not None and len(gdata) != K: raise Exception('need one guess per ephemeris')
+    tasks  = [ np.arange( i, min( i + chunk, K ) ) for i in range( 0, K, chunk ) ]
+    rows   = np.zeros( K, dtype=TLE_DTYPE )
+    info   = np.zeros( K, dtype=FIT_INFO_DTYPE )
+    sub    = lambda idx : gdata[idx] if gdata is not None else None
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        for idx in tasks:
+            _, rows[idx], info[idx] = _fit_chunk( idx, sub( idx ), fields, timeout, kwargs, arrays )
+    else:
+        blocks, specs = _share( arrays )
+        try:
+            with ProcessPoolExecutor( max_workers=min( workers, len(tasks) ), initializer=_attach, initargs=( specs, ) ) as pool:
+                futures = [ pool.submit( _fit_chunk, idx, sub( idx ), fields, timeout, kwargs ) for idx in tasks ]
+                for F in futures:
+                    idx, R, I = F.result()
+                    rows[idx], info[idx] = R, I
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    if satnos is not None: rows['satno'] = satnos
+    return TLECatalog( rows ), info
@@ -22,52 +22,80 @@
 # SOFTWARE.
 # ###############################################################################
 
-from datetime import datetime, timedelta
-import numpy as np
+from datetime import date, datetime, timedelta
 
 # -----------------------------------------------------------------------------------------------------
+# digits --> their value, '-' --> 1, everything else dropped : the checksum is then a sum over bytes
+_CHECKSUM_TABLE = { c : None for c in range(128) }
+_CHECKSUM_TABLE.update( { ord(str(d)) : chr(d) for d in range(10) } )
+_CHECKSUM_TABLE[ ord('-') ] = chr(1)
+
 def generate_checksum(line):
-    digits = sum(map(lambda x: int(x), filter(
-        lambda y: re.match('[0-9]{1}', y), [z for z in line])))
+    ''' mod 10 checksum: sum of the digits, minus signs count as 1 '''
+    if line.isascii(): return str( sum( line.translate( _CHECKSUM_TABLE ).encode() ) )[-1]
+    digits = sum( int(c) for c in line if c.isdigit() )
     minus = line.count('-')
     rV = str(digits + minus)
     return rV[-1]
 
-
 # -----------------------------------------------------------------------------------------------------
 def generate_expo_format(flt):
-    if np.abs(flt) < 9.9999e-9: return "+00000-0"
-    [mant, crap, exp] = '{:+4.4e}'.format(flt).partition('e')
-    mant = mant.replace('.', '')
-    if abs(int(exp)) > 9 : raise Exception('exponent is too large to express')
-    rV = '{:s}{:+1d}'.format(mant, int(exp) + 1)
-    return rV
+    if abs(flt) < 9.9999e-9: return "+00000-0"
+    # '+d.dddde+XX' : sign and leading digit, the 4 decimals, and the exponent (one higher, mantissa is 0.ddddd)
+    S = '{:+.4e}'.format(flt)
+    exp = int( S[8:] )
+    if abs(exp) > 9 : raise Exception('exponent is too large to express')
+    return S[:2] + S[3:7] + '%+d' % ( exp + 1 )
 
 # -----------------------------------------------------------------------------------------------------
 # this takes the "00000-0" format as specified in TLE's and outputs a float
 def process_expo_format(string):
     if string[0] == '-': neg = -1
     else: neg = 1
-    mant = string[1:-2]
-    exp = string[-2:]
-    return neg * float("0.{}".format(mant)) * (10 ** int(exp))
+    return neg * float( '0.' + string[1:-2] ) * (10 ** int( string[-2:] ))
     #return neg * float('0.%s' % mant) * (10 ** int(exp))
 
 # -----------------------------------------------------------------------------------------------------
+# epochs : YYDDD.DDDDDDDD, two digit years cover 1957 -- 2056, day of year starts at 1
+# 1e-8 day is exactly 864 microseconds, so all of the conversions below are done in integers
+
+_YEAR_START = {}    # two digit year --> January 1st
+
 def epoch_str_todatetime( S ):
-    year = int(S[0:2])
-    if year > 57: tyear = datetime( year=1900+year, month=1, day=1 )
-    if year < 57: tyear = datetime( year=2000+year, month=1, day=1 )
-    frac = float( S[2:] )
-    return tyear + timedelta( days=frac )
+    tyear = _YEAR_START.get( S[0:2] )
+    if tyear is None:
+        year = int(S[0:2])
+        tyear = _YEAR_START[ S[0:2] ] = datetime( year=1900+year if year >= 57 else 2000+year, month=1, day=1 )
+    day, _, dec = S[2:].strip().partition('.')
+    return tyear + timedelta( days=int(day) - 1, microseconds=int( ( dec + '00000000' )[:8] ) * 864 )
 
 # -----------------------------------------------------------------------------------------------------
+_JAN1 = {}     # year --> proleptic ordinal of January 1st
+
+def _jan1( year ):
+    jan1 = _JAN1.get( year )
+    if jan1 is None: jan1 = _JAN1[ year ] = date( year, 1, 1 ).toordinal()
+    return jan1
+
 def datetime_to_epochstr( dt ):
-    tyear = datetime(year=dt.year, day=1, month=1 )
-    frac = (dt - tyear).total_seconds() / 86400.
-    days = int(frac)
-    decimals = frac - days 
-    decimals = '{}'.format(np.round( decimals, 8 )).split('.')[1]
-    year = dt.strftime('%y')[:2]
-    days = '{:03d}'.format(days)[:3]
-    return '{}{}.{}'.format( year, days, decimals )
+    # day of year from ordinals and the time of day in integer microseconds (wall clock, tzinfo ignored)
+    year = dt.year
+    days = dt.toordinal() - _jan1( year )
+    rem  = ( ( dt.hour * 60 + dt.minute ) * 60 + dt.second ) * 1000000 + dt.microsecond
+    # always 8 decimals, rounded to the nearest 1e-8 day ; rounding up to midnight can carry into the next year
+    decimals = ( rem + 432 ) // 864
+    if decimals == 100000000:
+        days, decimals = days + 1, 0
+        if days == _jan1( year + 1 ) - _jan1( year ): year, days = year + 1, 0
+    return '%02d%03d.%08d' % ( year % 100, days + 1, decimals )
+
+# -----------------------------------------------------------------------------------------------------
+# the array versions live in arrays.py (numpy) ; still reachable from here, imported on first use
+_ARRAYS = ( 'generate_checksums', 'epoch_parts_to_datetime64', 'epoch_str_to_datetime64', 'epoch_str_to_jd',
+            'datetime64_to_epoch_parts', 'datetime64_to_epoch_str' )
+
+def __getattr__( name ):
+    if name in _ARRAYS:
+        from . import arrays
+        return getattr( arrays, name )
+    raise AttributeError( 'module {!r} has no attribute {!r}'.format( __name__, name ) )
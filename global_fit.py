@@ -0,0 +1,200 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# global ephemeris fitting : differential evolution in the tle_fitter optimizer (0--1) space
+# every generation is one batched SatrecArray propagation of the whole population (see _residuals); the
+# angles wrap around (difference vectors take the short way round), every other field is kept in range.
+# the population starts around a fromPV seed, and the best member is polished with fit_ephemeris (LM)
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .base import TLE
+from .tle_fitter import tle_fitter, fit_result, fit_ephemeris, split_jd, _residuals, FIT_FIELDS, WRAPPING, _EDGE
+from .tle_fitter import FIT_CONVERGED, FIT_MAX_ITER, FIT_TIMEOUT, FIT_PROPAGATION
+from .utils import julian
+
+# -----------------------------------------------------------------------------------------------------
+def _costs( fit, fields, X, jd, fr, target ):
+    ''' sum of squared position residuals of every candidate (rows of X), inf where sgp4 fails '''
+    R = _residuals( fit, fields, X, jd, fr, target )
+    with np.errstate( invalid='ignore', over='ignore' ):
+        C = np.einsum( 'ij,ij->i', R, R )
+    return np.where( np.isfinite( C ), C, np.inf )
+
+# worker side : the problem is sent once per process (initializer), tasks only carry population chunks
+_WORKER = {}
+
+def _setup( fit, fields, jd, fr, target ):
+    _WORKER['problem'] = ( fit, fields, jd, fr, target )
+
+def _worker_costs( X ):
+    fit, fields, jd, fr, target = _WORKER['problem']
+    return _costs( fit, fields, X, jd, fr, target )
+
+def _wrap_mask( fields ): return np.array( [ F in WRAPPING for F in fields ] )
+
+def _project( X, fields ):
+    ''' (K, n) candidates --> valid ones : angles wrapped into [0, 1), everything else reflected / clipped into range '''
+    X = np.array( X, dtype=float )
+    wrap = _wrap_mask( fields )
+    # a bounded field that stepped out is reflected back in (keeps the spread, unlike clipping everything to the edge)
+    B = X[:, ~wrap]
+    B = np.where( B < 0, -B, B )
+    B = np.where( B > 1, 2 - B, B )
+    X[:, ~wrap] = np.clip( B, _EDGE, 1. - _EDGE )
+    X[:, wrap] %= 1.
+    return X
+
+# -----------------------------------------------------------------------------------------------------
+def fit_ephemeris_global( times, states, fields=None, guess=None, tletype : int = 0,
+                          popsize : int = None, max_gen : int = 300, mutation=( 0.5, 1.0 ), crossover : float = 0.9,
+                          spread : float = 0.01, explore : float = 0.1, rms_tol : float = 0.1, tol : float = 1e-3, patience : int = 10,
+                          polish : bool = True, workers : int = 1, budget : float = None, seed=None, fr=None ):
+    '''
+    fit a TLE to a TEME ephemeris with differential evolution (DE/current-to-best/1/bin), for poor initial guesses
+    (high eccentricity, GEO, type 4) where fit_ephemeris' local steps get lost
+    times, states, guess, tletype, budget, fr : as for fit_ephemeris
+    fields    : the tle_fitter fields to solve for (default : FIT_FIELDS that exist for the TLE type)
+    popsize   : candidates per generation (default 10 per field), all propagated in one SatrecArray call
+    mutation  : differential weight, or a ( low, high ) range drawn anew every generation (dither)
+    crossover : probability of taking each field from the mutant
+    spread    : standard deviation of the initial population around the guess (optimizer units, 1 = full range)
+    explore   : fraction of the initial population drawn uniformly over the whole range instead
+    rms_tol   : stop once the best member is this close (position RMS, km) : close enough for the polish
+    tol       : or once the best cost improved by less than this (relative) over `patience` generations
+    polish    : finish with fit_ephemeris from the best member
+    workers   : processes sharing each generation's population (1 : all in this process)
+    seed      : numpy random seed
+    returns a fit_result (iterations are generations, nfev counts batched propagation calls, polish included)
+    '''
+    t0 = time.perf_counter()
+    if fr is None: jd, fr = split_jd( times )
+    else: jd, fr = np.asarray( times, dtype=float ), np.asarray( fr, dtype=float )
+    states = np.asarray( states, dtype=float )
+    target = states[:, 0:3]
+    if guess is None:
+        epoch = julian.jd_to_datetime( jd[0], fr[0] )[0].item()
+        guess = TLE.fromPV_batch( epoch, states[0:1, 0:3], states[0:1, 3:], type=tletype, catalog=False )[0][0]
+    fit = tle_fitter( guess._tle if isinstance( guess, tle_fitter ) else guess )
+    if fields is None: fields = [ F for F in FIT_FIELDS if F in fit.name_to_pos() ]
+    fields = list( fields )
+    n      = len( fields )
+    K      = max( popsize or 10 * n, 5 )
+    rng    = np.random.default_rng( seed )
+    wrap   = _wrap_mask( fields )
+
+    # initial population : the guess itself, a cloud around it, and a few uniform samples
+    x0 = fit.get_fields( fields )
+    X  = x0[None, :] + rng.normal( 0., spread, ( K, n ) )
+    X[0] = x0
+    U  = rng.random( K ) < explore
+    U[0] = False
+    X[U] = rng.random( ( U.sum(), n ) )
+    X  = _project( X, fields )
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor( max_workers=workers, initializer=_setup, initargs=( fit, fields, jd, fr, target ) )
+    def evaluate( X ):
+        if pool is None: return _costs( fit, fields, X, jd, fr, target )
+        return np.concatenate( list( pool.map( _worker_costs, np.array_split( X, workers ) ) ) )
+
+    try:
+        cost = evaluate( X )
+        nfev, gen, status = 1, 0, FIT_MAX_ITER
+        history = [ cost.min() ]
+        if not np.any( np.isfinite( cost ) ): status = FIT_PROPAGATION
+        elif history[-1] <= rms_tol ** 2 * len( target ): status = FIT_CONVERGED
+        while status == FIT_MAX_ITER and gen < max_gen:
+            if budget is not None and time.perf_counter() - t0 > budget:
+                status = FIT_TIMEOUT
+                break
+            gen += 1
+            best = X[ np.argmin( cost ) ]
+            F = rng.uniform( *mutation ) if np.ndim( mutation ) else mutation
+            # two distinct partners per member, neither of them the member itself
+            R = rng.random( ( K, K ) )
+            np.fill_diagonal( R, np.inf )
+            r1, r2 = np.argpartition( R, 2, axis=1 )[:, :2].T
+            D  = np.stack( [ best[None, :] - X, X[r1] - X[r2] ] )
+            # angles : the short way round the circle
+            D[..., wrap] = ( D[..., wrap] + 0.5 ) % 1. - 0.5
+            V = X + F * ( D[0] + D[1] )
+            take = rng.random( ( K, n ) ) < crossover
+            take[ np.arange( K ), rng.integers( 0, n, K ) ] = True
+            T = _project( np.where( take, V, X ), fields )
+
+            ct = evaluate( T )
+            nfev += 1
+            better = ct <= cost
+            X[better], cost[better] = T[better], ct[better]
+            history.append( cost.min() )
+            if history[-1] <= rms_tol ** 2 * len( target ) or \
+               len( history ) > patience and history[-1 - patience] - history[-1] <= tol * history[-1 - patience]:
+                status = FIT_CONVERGED
+                break
+    finally:
+        if pool is not None: pool.shutdown()
+
+    i = int( np.argmin( cost ) )
+    x = X[i]
+    fit.from_fields( fields, x )
+    rms = float( np.sqrt( cost[i] / len( target ) ) ) if np.isfinite( cost[i] ) else np.inf
+    res = fit_result( fit, x, fields, rms, gen, nfev, time.perf_counter() - t0, status )
+    if polish and np.isfinite( cost[i] ) and status != FIT_TIMEOUT:
+        left = None if budget is None else max( budget - ( time.perf_counter() - t0 ), 0. )
+        P = fit_ephemeris( jd, states, fields=fields, guess=fit, budget=left, fr=fr )
+        if P.rms <= res.rms:
+            res = fit_result( P.fit, P.x, fields, P.rms, gen, nfev + P.nfev, time.perf_counter() - t0, P.status )
+        else:
+            res.nfev, res.elapsed = nfev + P.nfev, time.perf_counter() - t0
+    return res
+
+# -----------------------------------------------------------------------------------------------------
+def test( workers : int = 1 ):
+    ''' Molniya orbit from a poor guess (fit_ephemeris cannot even propagate it) '''
+    from sgp4.api import Satrec
+    L1 = '1 12345U          23152.50000000 +.00000000 +00000-0 +00000-0 0  9990'
+    L2 = '2 12345  62.9000 200.0000 7200000 270.0000  10.0000  2.00580000    00'
+    sat  = Satrec.twoline2rv( L1, L2 )
+    mins = np.arange( 0, 2880, 10. )
+    jd, fr = np.full( len(mins), sat.jdsatepoch ), sat.jdsatepochF + mins / 1440
+    e, r, v = sat.sgp4_array( jd, fr )
+    eph = np.hstack( [ r, v ] )
+
+    guess = TLE.parseLines( L1, L2 )
+    guess.inclination, guess.RAAN, guess.eccentricity = 65.9, 208., 0.956
+    guess.arg_perigee, guess.mean_anomaly, guess.mean_motion = 310., 340., 2.0359
+    print('LM    ', fit_ephemeris( jd, eph, guess=guess, fr=fr ) )
+    res = fit_ephemeris_global( jd, eph, guess=guess, fr=fr, seed=1, workers=workers )
+    print('global', res )
+    print( str( res.fit ) )
+    print( L1 )
+    print( L2 )
+
+if __name__ == '__main__':
+    test()
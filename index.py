@@ -0,0 +1,234 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# in-memory catalog indexed by ( satno, epoch ) for "latest elset of X", "elset of X nearest to t" and
+# "elsets of X between t0 and t1" queries
+# rows are kept sorted by satno, then epoch; every object is one contiguous run of rows, so a query is a
+# binary search for the run followed by a binary search on the epochs inside it (both O(log n))
+# inserts sort only the new rows and merge them in, the existing rows are never re-sorted
+
+import time
+import numpy as np
+
+from .catalog import TLECatalog, TLE_DTYPE
+
+# -----------------------------------------------------------------------------------------------------
+def _ticks( when ):
+    ''' datetime / datetime64 (scalar or array) --> int64 microseconds, same units as the epoch column '''
+    return np.asarray( when, dtype='datetime64[us]' ).astype( np.int64 )
+
+def _bisect( T, lo, hi, t, right=False ):
+    '''
+    vectorized searchsorted of t[i] inside T[lo[i]:hi[i]] (each slice sorted), returns absolute positions
+    '''
+    lo, hi = lo.copy(), hi.copy()
+    if len(T) == 0: return lo
+    active = lo < hi
+    while np.any( active ):
+        mid = ( lo + hi ) // 2
+        v = T[ np.minimum( mid, len(T) - 1 ) ]
+        go = ( v <= t ) if right else ( v < t )
+        lo = np.where( active & go, mid + 1, lo )
+        hi = np.where( active & ~go, mid, hi )
+        active = lo < hi
+    return lo
+
+# -----------------------------------------------------------------------------------------------------
+class TLEIndex( TLECatalog ):
+    '''
+    TLECatalog kept sorted by ( satno, epoch ) with O(log n) lookups per object
+    rows come back as TLE_2 / TLE_4 objects (or sub-catalogs for ranges), like any TLECatalog
+    elsets sharing satno and epoch are all kept, in insertion order (latest returns the last one inserted)
+    '''
+    def __init__(self, data=None):
+        if data is None: data = np.zeros( 0, dtype=TLE_DTYPE )
+        data = data[ np.lexsort( ( data['epoch'], data['satno'] ) ) ]
+        TLECatalog.__init__( self, data )
+        self._reindex()
+
+    @staticmethod
+    def from_catalog( catalog ):
+        return TLEIndex( catalog.data )
+
+    def _reindex( self ):
+        ''' satno runs : self._satnos[k] occupies rows self._starts[k] : self._starts[k+1] '''
+        S = self.data['satno']
+        edges = np.flatnonzero( S[1:] != S[:-1] ) + 1
+        self._starts = np.concatenate( ( [0], edges, [len(S)] ) ).astype( np.int64 ) if len(S) else np.zeros( 1, dtype=np.int64 )
+        self._satnos = S[ self._starts[:-1] ].astype( np.int64 )
+        self._T      = self.data['epoch'].view( np.int64 )
+        self._run_of = dict( zip( self._satnos.tolist(), range( len(self._satnos) ) ) )
+
+    def _run( self, satno ):
+        ''' ( lo, hi ) rows of a single satno, plain ints ( 0, 0 ) when unknown '''
+        k = self._run_of.get( int( satno ) )
+        if k is None: return 0, 0
+        return int( self._starts[k] ), int( self._starts[k+1] )
+
+    def _runs( self, satnos ):
+        ''' ( lo, hi ) row bounds of each satno ( lo == hi when the object is unknown ) '''
+        satnos = np.asarray( satnos, dtype=np.int64 )
+        k = np.searchsorted( self._satnos, satnos )
+        found = k < len(self._satnos)
+        found[found] = self._satnos[ k[found] ] == satnos[found]
+        lo = np.where( found, self._starts[ np.minimum( k, len(self._starts) - 1 ) ], 0 )
+        hi = np.where( found, self._starts[ np.minimum( k + 1, len(self._starts) - 1 ) ], 0 )
+        return lo, hi
+
+    # -------------------------------------------------------------------------------------------------
+    # row index queries, vectorized over satnos / times ( -1 where there is no answer )
+    def latest_index( self, satnos ):
+        lo, hi = self._runs( satnos )
+        return np.where( hi > lo, hi - 1, -1 )
+
+    def nearest_index( self, satnos, when ):
+        ''' row of each object with the epoch closest to when (ties go to the earlier elset) '''
+        lo, hi = self._runs( satnos )
+        t = np.broadcast_to( _ticks( when ), lo.shape )
+        i = _bisect( self._T, lo, hi, t )
+        before = np.maximum( i - 1, lo )
+        after  = np.minimum( i, np.maximum( hi - 1, lo ) )
+        if len(self._T) == 0: return np.full( lo.shape, -1 )
+        T = self._T
+        use_after = ( i < hi ) & ( ( i == lo ) | ( T[ np.minimum( after, len(T) - 1 ) ] - t < t - T[ np.minimum( before, len(T) - 1 ) ] ) )
+        best = np.where( use_after, after, before )
+        return np.where( hi > lo, best, -1 )
+
+    def range_index( self, satno, t0, t1 ):
+        ''' ( start, stop ) rows of one object with t0 <= epoch <= t1 '''
+        lo, hi = self._run( satno )
+        T = self._T[ lo:hi ]
+        return lo + int( np.searchsorted( T, _ticks( t0 ), 'left' ) ), lo + int( np.searchsorted( T, _ticks( t1 ), 'right' ) )
+
+    # -------------------------------------------------------------------------------------------------
+    # TLE object queries
+    # (single object queries skip the vectorized machinery : one dict lookup plus at most one searchsorted)
+    def latest( self, satno ):
+        ''' most recent elset of satno (None if unknown) '''
+        lo, hi = self._run( satno )
+        return self.get_tle( hi - 1 ) if hi > lo else None
+
+    def nearest( self, satno, when ):
+        ''' elset of satno with the epoch closest to when (None if unknown) '''
+        lo, hi = self._run( satno )
+        if hi == lo: return None
+        t = int( _ticks( when ) )
+        i = lo + int( np.searchsorted( self._T[ lo:hi ], t ) )
+        if i == hi or ( i > lo and t - self._T[i-1] <= self._T[i] - t ): i -= 1
+        return self.get_tle( i )
+
+    def between( self, satno, t0, t1 ):
+        ''' TLECatalog of every elset of satno with t0 <= epoch <= t1, oldest first (a view, no copy) '''
+        start, stop = self.range_index( satno, t0, t1 )
+        return TLECatalog( self.data[ start:stop ] )
+
+    def history( self, satno ):
+        ''' every elset of satno, oldest first '''
+        lo, hi = self._run( satno )
+        return TLECatalog( self.data[ lo:hi ] )
+
+    def latest_catalog( self ):
+        ''' TLECatalog with the most recent elset of every object '''
+        return TLECatalog( self.data[ self._starts[1:] - 1 ] )
+
+    def satnos( self ): return self._satnos.copy()
+
+    def __contains__( self, satno ): return int( satno ) in self._run_of
+
+    # -------------------------------------------------------------------------------------------------
+    def insert( self, elsets ):
+        '''
+        add a TLECatalog, a TLE_DTYPE array or a list of TLE objects
+        only the new rows are sorted ( k log k ), then they are merged into place ( O(n + k) copy )
+        '''
+        if isinstance( elsets, TLECatalog ): new = elsets.data
+        elif isinstance( elsets, np.ndarray ): new = elsets
+        else: new = TLECatalog.from_tles( list( elsets ) ).data
+        if len(new) == 0: return self
+        new = new[ np.lexsort( ( new['epoch'], new['satno'] ) ) ]
+
+        # each new row goes after the existing rows of the same satno with epoch <= its own
+        lo, hi = self._runs( new['satno'] )
+        k = np.searchsorted( self._satnos, new['satno'].astype( np.int64 ) )
+        pos = np.where( hi > lo, _bisect( self._T, lo, hi, new['epoch'].view( np.int64 ), right=True ),
+                        self._starts[ np.minimum( k, len(self._starts) - 1 ) ] )
+        self.data = np.insert( self.data, pos, new )
+        self._reindex()
+        return self
+
+    def __repr__( self ): return 'TLEIndex({} elsets, {} objects)'.format( len(self), len(self._satnos) )
+
+
+# -----------------------------------------------------------------------------------------------------
+def _random_data( n, nobj, rng ):
+    ''' synthetic TLE_DTYPE rows : nobj objects, epochs spread over ten years '''
+    data = np.zeros( n, dtype=TLE_DTYPE )
+    data['satno'] = rng.integers( 1, nobj + 1, n )
+    data['epoch'] = np.datetime64( '2015-01-01', 'us' ) + rng.integers( 0, 10 * 365 * 86400 * 10 ** 6, n ).astype( 'timedelta64[us]' )
+    data['type']  = 0
+    data['class'] = b'U'
+    data['mm']    = 15.
+    return data
+
+def benchmark( n=1000000, nobj=30000, queries=100000, seed=0 ):
+    ''' build / query / insert timings for an n elset index (against a linear scan over dict-of-lists) '''
+    rng  = np.random.default_rng( seed )
+    data = _random_data( n, nobj, rng )
+    t = time.perf_counter(); IX = TLEIndex( data ); print('build {} elsets / {} objects : {:.3f} s'.format( n, nobj, time.perf_counter() - t ))
+
+    sats  = rng.integers( 1, nobj + 1, queries )
+    when  = np.datetime64( '2015-01-01', 'us' ) + rng.integers( 0, 10 * 365 * 86400 * 10 ** 6, queries ).astype( 'timedelta64[us]' )
+
+    t = time.perf_counter(); IX.latest_index( sats ); dt = time.perf_counter() - t
+    print('latest_index  : {} queries {:.3f} s ({:.2f} us / query)'.format( queries, dt, 1e6 * dt / queries ))
+    t = time.perf_counter(); IX.nearest_index( sats, when ); dt = time.perf_counter() - t
+    print('nearest_index : {} queries {:.3f} s ({:.2f} us / query)'.format( queries, dt, 1e6 * dt / queries ))
+
+    m = min( queries, 10000 )
+    t = time.perf_counter()
+    for s in sats[:m].tolist(): IX.latest( s )
+    dt = time.perf_counter() - t
+    print('latest        : {} single queries {:.3f} s ({:.2f} us / query)'.format( m, dt, 1e6 * dt / m ))
+    t = time.perf_counter()
+    for s, w in zip( sats[:m].tolist(), when[:m] ): IX.nearest( s, w )
+    dt = time.perf_counter() - t
+    print('nearest       : {} single queries {:.3f} s ({:.2f} us / query)'.format( m, dt, 1e6 * dt / m ))
+    t = time.perf_counter()
+    for s, w in zip( sats[:m].tolist(), when[:m] ): IX.between( s, w, w + np.timedelta64( 30, 'D' ) )
+    dt = time.perf_counter() - t
+    print('between       : {} single queries {:.3f} s ({:.2f} us / query)'.format( m, dt, 1e6 * dt / m ))
+
+    # what it replaces : dict of lists, scanned linearly
+    by_sat = {}
+    for s, e in zip( data['satno'].tolist(), data['epoch'].view( np.int64 ).tolist() ): by_sat.setdefault( s, [] ).append( e )
+    t = time.perf_counter()
+    for s in sats[:m].tolist(): max( by_sat.get( s, [0] ) )
+    dt = time.perf_counter() - t
+    print('dict scan     : {} single latest epochs (no TLE built) {:.3f} s ({:.2f} us / query)'.format( m, dt, 1e6 * dt / m ))
+
+    extra = _random_data( n // 10, nobj, rng )
+    t = time.perf_counter(); IX.insert( extra ); dt = time.perf_counter() - t
+    print('insert        : {} elsets into {} : {:.3f} s'.format( len(extra), n, dt ))
+    return IX
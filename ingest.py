@@ -0,0 +1,251 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# asyncio ingestion of live 2LE / 3LE feeds (sockets, pipes, any async source of text)
+# each feed is read in large chunks and cut into micro-batches (by size, or after `linger` seconds on a quiet
+# feed); framing, validation and parsing of a batch run in an executor, so the event loop only moves bytes
+# parsed batches go to a bounded asyncio.Queue : when consumers fall behind, put() waits, the feed stops
+# being read and the sender is held back by the socket / pipe buffers (backpressure)
+
+import asyncio
+import time
+import numpy as np
+
+from .catalog import TLECatalog, _frame
+
+# -----------------------------------------------------------------------------------------------------
+def _cut( buf, final ):
+    '''
+    split a batch at the last record boundary : ( bytes to parse, bytes to carry over )
+    only the last three complete lines are looked at (the batch is framed once, in the executor); the carry is
+    at most the trailing partial line plus two whole lines (name + line 1 waiting for line 2)
+    '''
+    if final: return bytes( buf ), b''
+    last = buf.rfind( b'\n' ) + 1
+    if last == 0: return b'', bytes( buf )
+    # starts of the last three complete lines, -1 where there are fewer
+    s1 = buf.rfind( b'\n', 0, last - 1 ) + 1
+    s2 = buf.rfind( b'\n', 0, s1 - 1 ) + 1 if s1 > 0 else -1
+    s3 = buf.rfind( b'\n', 0, s2 - 1 ) + 1 if s2 > 0 else -1
+    first = lambda s : buf[ s:s+1 ] if s >= 0 else b''
+    if first( s1 ) == b'2' and first( s2 ) == b'1':   done = last              # ends on a whole record
+    elif first( s2 ) == b'2' and first( s3 ) == b'1': done = s1                # a name or line 1 after a record
+    elif first( s1 ) == b'1':                          done = max( s2, 0 )      # name + line 1
+    else:                                              done = s1
+    return bytes( buf[:done] ), bytes( buf[done:] )
+
+def _parse( text, validate ):
+    ''' executor side : ( TLECatalog, number of records dropped by validation ) '''
+    fr  = _frame( text )
+    cat = TLECatalog._from_frame( text, fr, validate=validate )
+    return cat, len( fr['s1'] ) - len( cat )
+
+class feed_stats:
+    ''' per feed counters '''
+    def __init__(self, name):
+        self.name     = name
+        self.bytes    = 0
+        self.records  = 0
+        self.rejected = 0
+        self.batches  = 0
+        self.errors   = 0
+        self.started  = time.perf_counter()
+        self.closed   = None
+
+    @property
+    def rate( self ):
+        ''' records / second over the life of the feed '''
+        dt = ( self.closed or time.perf_counter() ) - self.started
+        return self.records / dt if dt > 0 else 0.
+
+    def __repr__( self ):
+        return 'feed_stats({}: {} records, {} rejected, {} batches, {} errors, {:.0f} records/s)'.format(
+                self.name, self.records, self.rejected, self.batches, self.errors, self.rate )
+
+# -----------------------------------------------------------------------------------------------------
+class TLEIngest:
+    '''
+    async pipeline stage : many feeds in, ( feed name, TLECatalog ) micro-batches out on self.queue
+
+        ingest = TLEIngest( maxsize=16 )
+        reader, _ = await asyncio.open_connection( host, port )
+        asyncio.create_task( ingest.run( reader, pipe_reader ) )
+        while ( item := await ingest.queue.get() ) is not None:
+            name, catalog = item
+
+    batch    : bytes per micro-batch (about 150 bytes per 3LE record)
+    linger   : seconds a partial batch may wait on a quiet feed before it is parsed anyway
+    executor : concurrent.futures executor for the parsing (None : the loop's default thread pool)
+    validate : drop records failing validate.validate_arrays (checksums, layout, satno agreement)
+    '''
+    def __init__(self, maxsize : int = 64, batch : int = 1 << 18, linger : float = 0.05, executor=None,
+                 validate : bool = True, chunk : int = 1 << 16):
+        self.queue    = asyncio.Queue( maxsize )
+        self.batch    = batch
+        self.linger   = linger
+        self.executor = executor
+        self.validate = validate
+        self.chunk    = chunk
+        self.stats    = {}
+
+    async def _chunks( self, source ):
+        ''' bytes from a StreamReader (read in chunks) or an async iterable of str / bytes lines '''
+        if hasattr( source, 'read' ):
+            while True:
+                data = await source.read( self.chunk )
+                if not data: return
+                yield data
+        else:
+            async for line in source:
+                if isinstance( line, str ): line = line.encode( 'ascii', 'replace' )
+                yield line if line.endswith( b'\n' ) else line + b'\n'
+
+    async def _flush( self, buf, stats, final=False ):
+        ''' parse what is complete in buf (in the executor), publish it, return the carry-over '''
+        text, carry = _cut( buf, final )
+        if text:
+            loop = asyncio.get_running_loop()
+            try:
+                cat, dropped = await loop.run_in_executor( self.executor, _parse, text, self.validate )
+            except Exception:
+                # a batch that cannot be parsed at all (validate=False and broken lines) is dropped whole
+                stats.errors += 1
+                return bytearray( carry )
+            stats.batches  += 1
+            stats.records  += len(cat)
+            stats.rejected += dropped
+            if len(cat): await self.queue.put( ( stats.name, cat ) )
+        return bytearray( carry )
+
+    async def feed( self, source, name=None ):
+        ''' ingest one source until it ends; returns its feed_stats '''
+        name  = name if name is not None else 'feed{}'.format( len(self.stats) )
+        stats = self.stats[name] = feed_stats( name )
+        buf   = bytearray()
+        loop  = asyncio.get_running_loop()
+        chunks = self._chunks( source ).__aiter__()
+        deadline = None
+        pending = asyncio.ensure_future( chunks.__anext__() )
+        while True:
+            timeout = None if deadline is None else max( deadline - loop.time(), 0. )
+            done, _ = await asyncio.wait( { pending }, timeout=timeout )
+            if not done:
+                # quiet feed : parse whatever is complete, keep waiting on the same read
+                buf, deadline = await self._flush( buf, stats ), None
+                continue
+            try: data = pending.result()
+            except StopAsyncIteration: break
+            except ( ConnectionError, OSError ):
+                stats.errors += 1
+                break
+            pending = asyncio.ensure_future( chunks.__anext__() )
+            buf += data
+            stats.bytes += len(data)
+            if deadline is None: deadline = loop.time() + self.linger
+            if len(buf) >= self.batch: buf, deadline = await self._flush( buf, stats ), None
+        await self._flush( buf, stats, final=True )
+        stats.closed = time.perf_counter()
+        return stats
+
+    async def run( self, *sources, names=None, close : bool = True ):
+        '''
+        ingest every source concurrently; with close=True a None is queued once all of them have ended
+        sources : asyncio StreamReaders (sockets, pipes via connect_pipe) or async iterables of lines
+        '''
+        names = names or [ None ] * len(sources)
+        try:
+            return await asyncio.gather( *[ self.feed( S, N ) for S, N in zip( sources, names ) ] )
+        finally:
+            if close: await self.queue.put( None )
+
+async def connect_pipe( pipe ):
+    ''' asyncio StreamReader over the read end of a pipe (file object or descriptor) '''
+    import os
+    if isinstance( pipe, int ): pipe = os.fdopen( pipe, 'rb', buffering=0 )
+    loop   = asyncio.get_running_loop()
+    reader = asyncio.StreamReader( limit=1 << 20 )
+    await loop.connect_read_pipe( lambda : asyncio.StreamReaderProtocol( reader ), pipe )
+    return reader
+
+
+# -----------------------------------------------------------------------------------------------------
+# local stand-in feeds
+
+def _standin_text( n, first=1 ):
+    ''' n 3LE records of the ISS elset under satnos first .. first + n - 1 '''
+    from .base import gL1, gL2
+    cat = TLECatalog.from_lines( [ gL1, gL2 ] )
+    cat = TLECatalog( np.repeat( cat.data, n ) )
+    cat.data['satno'] = np.arange( first, first + n )
+    return b''.join( 'SAT {}\n{}\n{}\n'.format( i, L1, L2 ).encode() for i, ( L1, L2 ) in zip( cat.data['satno'], cat.generateLines() ) )
+
+async def _serve( text, step=8192 ):
+    ''' TCP server on localhost sending text in step byte writes; returns ( server, port ) '''
+    async def handle( reader, writer ):
+        for i in range( 0, len(text), step ):
+            writer.write( text[i:i+step] )
+            await writer.drain()
+        writer.close()
+    server = await asyncio.start_server( handle, '127.0.0.1', 0 )
+    return server, server.sockets[0].getsockname()[1]
+
+async def _test( n=20000 ):
+    import os
+    ingest = TLEIngest( maxsize=4, batch=1 << 16 )
+    text   = _standin_text( n )
+    server, port = await _serve( text )
+    sock, _ = await asyncio.open_connection( '127.0.0.1', port )
+
+    # a pipe fed from a thread, with a few corrupted records
+    rfd, wfd = os.pipe()
+    bad = bytearray( _standin_text( 1000, first=100000 ) )
+    bad[ 200:205 ] = b'XXXXX'
+    loop = asyncio.get_running_loop()
+    def write_pipe():
+        with os.fdopen( wfd, 'wb' ) as F: F.write( bytes( bad ) )
+    writer = loop.run_in_executor( None, write_pipe )
+    pipe = await connect_pipe( rfd )
+
+    async def lines():
+        for L in _standin_text( 500, first=200000 ).decode().splitlines():
+            yield L
+            if L.startswith( '2' ): await asyncio.sleep( 0 )
+
+    t0 = time.perf_counter()
+    task = asyncio.create_task( ingest.run( sock, pipe, lines(), names=[ 'tcp', 'pipe', 'lines' ] ) )
+    total, batches = 0, 0
+    while ( item := await ingest.queue.get() ) is not None:
+        total   += len( item[1] )
+        batches += 1
+        await asyncio.sleep( 0.001 )        # slow consumer : the queue fills and the feeds wait
+    await task
+    await writer
+    server.close()
+    dt = time.perf_counter() - t0
+    print('{} records in {} batches, {:.2f} s ({:.0f} records/s)'.format( total, batches, dt, total / dt ))
+    for S in ingest.stats.values(): print( S )
+
+def test( n=20000 ):
+    asyncio.run( _test( n ) )
@@ -0,0 +1,156 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# opt-in instrumentation of the hot paths : call counters and cumulative (inclusive) timers
+#
+#   from PyTLE import instrument
+#   with instrument.instrumented( hook=print ):          # or instrument.enable() / instrument.disable()
+#       ... job ...
+#   print( instrument.report() )
+#
+# enable() swaps timed wrappers in for the target functions everywhere the package holds a reference to them
+# (module globals, class attributes, staticmethods) and disable() swaps the originals back, so with
+# instrumentation off the hot loops run the original functions untouched : no flag test, no extra call
+
+import functools
+import sys
+import time
+from contextlib import contextmanager
+
+# ( metric name, module, class or None, attribute )
+TARGETS = [
+        ( 'TLE.parseLines',                   'base',       'TLE',        'parseLines' ),
+        ( 'TLE_2.generateLines',              'base',       'TLE_2',      'generateLines' ),
+        ( 'TLE_4.generateLines',              'base',       'TLE_4',      'generateLines' ),
+        ( 'TLE.fromCOE',                      'base',       'TLE',        'fromCOE' ),
+        ( 'TLE.fromPV',                       'base',       'TLE',        'fromPV' ),
+        ( 'tle_fitter.to_array',              'tle_fitter', 'tle_fitter', 'to_array' ),
+        ( 'tle_fitter.from_array',            'tle_fitter', 'tle_fitter', 'from_array' ),
+        ( 'fit_ephemeris',                    'tle_fitter', None,         'fit_ephemeris' ),
+        ( 'formatters.generate_checksum',     'formatters', None,         'generate_checksum' ),
+        ( 'formatters.generate_expo_format',  'formatters', None,         'generate_expo_format' ),
+        ( 'formatters.process_expo_format',   'formatters', None,         'process_expo_format' ),
+        ( 'formatters.epoch_str_todatetime',  'formatters', None,         'epoch_str_todatetime' ),
+        ( 'formatters.datetime_to_epochstr',  'formatters', None,         'datetime_to_epochstr' ),
+        ( 'TLECatalog.from_buffer',           'catalog',    'TLECatalog', 'from_buffer' ),
+        ( 'TLECatalog.generateLines',         'catalog',    'TLECatalog', 'generateLines' ),
+        ( 'TLECatalog.to_bytes',              'catalog',    'TLECatalog', 'to_bytes' ),
+        ]
+
+_PACKAGE = __name__.rpartition( '.' )[0]
+
+_stats   = {}       # metric name -> [ calls, seconds ]
+_patched = []       # ( original, wrapper ) pairs while enabled
+_hooks   = []
+
+# -----------------------------------------------------------------------------------------------------
+def _timed( func, stat ):
+    @functools.wraps( func )
+    def wrapper( *args, **kwargs ):
+        t = time.perf_counter()
+        try: return func( *args, **kwargs )
+        finally:
+            stat[0] += 1
+            stat[1] += time.perf_counter() - t
+    return wrapper
+
+def _replace( old, new ):
+    ''' point every reference the loaded package modules (and their classes) hold to old at new '''
+    for name, module in list( sys.modules.items() ):
+        if module is None or not ( name == _PACKAGE or name.startswith( _PACKAGE + '.' ) ): continue
+        for key, val in list( vars( module ).items() ):
+            if val is old: setattr( module, key, new )
+            elif isinstance( val, type ) and val.__module__ == name:
+                for attr, member in list( vars( val ).items() ):
+                    if member is old: setattr( val, attr, new )
+                    elif isinstance( member, staticmethod ) and member.__func__ is old: setattr( val, attr, staticmethod( new ) )
+
+def _resolve( module, cls, attr ):
+    import importlib
+    owner = importlib.import_module( '{}.{}'.format( _PACKAGE, module ) )
+    if cls is not None: owner = getattr( owner, cls )
+    func = vars( owner )[attr] if cls is not None else getattr( owner, attr )
+    return func.__func__ if isinstance( func, staticmethod ) else func
+
+def enabled( ): return bool( _patched )
+
+def enable( ):
+    ''' start counting (no-op if already on) '''
+    if _patched: return
+    for name, module, cls, attr in TARGETS:
+        func = _resolve( module, cls, attr )
+        wrapper = _timed( func, _stats.setdefault( name, [ 0, 0. ] ) )
+        _replace( func, wrapper )
+        _patched.append( ( func, wrapper ) )
+
+def disable( ):
+    ''' put the original functions back (counters are kept until reset) '''
+    while _patched:
+        func, wrapper = _patched.pop()
+        _replace( wrapper, func )
+
+def reset( ):
+    for stat in _stats.values(): stat[0], stat[1] = 0, 0.
+
+# -----------------------------------------------------------------------------------------------------
+def snapshot( ):
+    ''' { metric : { calls, seconds, mean_us } } for every metric called at least once '''
+    return { name : { 'calls' : calls, 'seconds' : secs, 'mean_us' : 1e6 * secs / calls }
+             for name, ( calls, secs ) in _stats.items() if calls }
+
+def report( ):
+    ''' human readable table of the snapshot, most expensive first (times are inclusive of nested metrics) '''
+    rows = sorted( snapshot().items(), key=lambda kv : -kv[1]['seconds'] )
+    out = [ '{:<36s} {:>10s} {:>12s} {:>12s}'.format( 'metric', 'calls', 'seconds', 'mean us' ) ]
+    for name, S in rows:
+        out.append( '{:<36s} {:>10d} {:>12.4f} {:>12.2f}'.format( name, S['calls'], S['seconds'], S['mean_us'] ) )
+    return '\n'.join( out )
+
+def add_hook( hook ):
+    ''' hook( snapshot ) is called by emit(), e.g. to forward metrics to statsd / prometheus / a log '''
+    _hooks.append( hook )
+
+def remove_hook( hook ):
+    _hooks.remove( hook )
+
+def emit( ):
+    ''' hand the current snapshot to every hook '''
+    snap = snapshot()
+    for hook in list( _hooks ): hook( snap )
+    return snap
+
+@contextmanager
+def instrumented( hook=None, reset_first : bool = True ):
+    '''
+    instrumentation on for the block; hook( snapshot ) is called on exit (as well as the add_hook ones)
+    '''
+    was = enabled()
+    if reset_first: reset()
+    enable()
+    try: yield sys.modules[__name__]
+    finally:
+        if not was: disable()
+        snap = emit()
+        if hook is not None: hook( snap )
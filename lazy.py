@@ -0,0 +1,172 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+# compact TLE records : no __dict__ and no slot per field, only the raw 2 x 69 characters
+# every data member (_incl, _epoch, ...) is decoded from the raw lines each time it is read; members that are
+# written (setters, tle_fitter.from_array, ...) go to a small dict of edits that is only created on the first
+# write, so the TLE properties (inclination, RAAN, epoch ...) and the TLE_2 / TLE_4 writers work unchanged on
+# top of them. nothing derived (lines, perigee / apogee) is cached : a record stays its raw lines for good
+
+from .alpha import alpha_to_integer
+from .base import TLE, TLE_2, TLE_4, EARTH_RADIUS, SMA_K
+from .formatters import process_expo_format, epoch_str_todatetime
+
+# -----------------------------------------------------------------------------------------------------
+class _lazy:
+    ''' data member decoded from the raw lines on every read, unless it was written '''
+    __slots__ = ( 'name', 'decode' )
+
+    def __init__(self, name, decode):
+        self.name   = name
+        self.decode = decode
+
+    def __get__( self, obj, owner=None ):
+        if obj is None: return self
+        edits = obj._edits
+        if edits is not None and self.name in edits: return edits[ self.name ]
+        return self.decode( obj._raw )
+
+    def __set__( self, obj, val ):
+        if obj._edits is None: obj._edits = {}
+        obj._edits[ self.name ] = val
+
+def _install( cls, decoders ):
+    ''' { data member : decoder( raw ) } --> lazy members of cls '''
+    for name, decode in decoders.items():
+        setattr( cls, name, _lazy( name, decode ) )
+
+# columns of the second line inside the raw string
+_L2 = 69
+
+_COMMON = {
+        '_satno'   : lambda R : alpha_to_integer( R[2:7] ),
+        '_class'   : lambda R : R[7],
+        '_intld'   : lambda R : R[9:17],
+        '_epoch'   : lambda R : epoch_str_todatetime( R[18:32] ),
+        '_elset'   : lambda R : int( R[64:68] ),
+        '_incl'    : lambda R : float( R[_L2+8:_L2+16] ),
+        '_raan'    : lambda R : float( R[_L2+17:_L2+25] ),
+        '_ecc'     : lambda R : float( '0.{}'.format( R[_L2+26:_L2+33] ) ),
+        '_argp'    : lambda R : float( R[_L2+34:_L2+42] ),
+        '_ma'      : lambda R : float( R[_L2+43:_L2+51] ),
+        '_mm'      : lambda R : float( R[_L2+52:_L2+63] ),
+        }
+
+# (TLE_2 / TLE_4 set _type to 0 / 4 whatever the line says)
+_TYPE2 = {
+        '_type'    : lambda R : 0,
+        '_ndot'    : lambda R : float( R[33:43] ),
+        '_ndotdot' : lambda R : process_expo_format( R[44:52] ),
+        '_bstar'   : lambda R : process_expo_format( R[53:61] ),
+        '_B'       : lambda R : 0.,
+        '_agom'    : lambda R : 0.,
+        }
+
+_TYPE4 = {
+        '_type'    : lambda R : 4,
+        '_ndot'    : lambda R : 0.,
+        '_ndotdot' : lambda R : 0.,
+        '_bstar'   : lambda R : 0.,
+        '_B'       : lambda R : process_expo_format( R[53:61] ),
+        '_agom'    : lambda R : process_expo_format( R[44:52] ),
+        }
+
+# -----------------------------------------------------------------------------------------------------
+class LazyTLE:
+    '''
+    slotted, lazily decoded stand-in for TLE_2 / TLE_4 (use LazyTLE.parseLines)
+    '''
+    __slots__ = ( '_raw', '_edits' )
+
+    def __init__(self, L1, L2):
+        if L1[0] != '1' : raise Exception('LINE1 must begin with 1')
+        if L2[0] != '2' : raise Exception('LINE2 must begin with 2')
+        if L1[2:7] != L2[2:7] : raise Exception('satno does not match')
+        self._raw   = L1[:69].ljust(69) + L2[:69].ljust(69)
+        self._edits = None
+
+    @staticmethod
+    def parseLines( L1, L2 ):
+        if L1[62] == '0' or L1[62] == '2' : return LazyTLE_2( L1, L2 )
+        if L1[62] == '4' : return LazyTLE_4( L1, L2 )
+
+    # everything below comes straight from TLE
+    epoch        = TLE.epoch
+    satno        = TLE.satno
+    inclination  = TLE.inclination
+    RAAN         = TLE.RAAN
+    eccentricity = TLE.eccentricity
+    arg_perigee  = TLE.arg_perigee
+    mean_anomaly = TLE.mean_anomaly
+    mean_motion  = TLE.mean_motion
+    B            = TLE.B
+    AGOM         = TLE.AGOM
+    set_note     = TLE.set_note
+    parseDate    = TLE.parseDate
+    __str__      = TLE.__str__
+    __repr__     = TLE.__repr__
+
+    # computed on every call, like TLE._calculate_apogee_perigee but without keeping anything
+    def _apsides( self, earth_rad = EARTH_RADIUS ):
+        semi_major = ( SMA_K / self.mean_motion ) ** ( 2.0 / 3.0 )
+        return semi_major * ( 1 - self.eccentricity ) - earth_rad, semi_major * ( 1 + self.eccentricity ) - earth_rad
+
+    @property
+    def perigee( self ): return self._apsides()[0]
+
+    @property
+    def apogee( self ): return self._apsides()[1]
+
+    def _lines( self ): return self._buildLine1(), self._buildLine2()
+
+    def to_tle( self ):
+        ''' fully decoded, regular TLE_2 / TLE_4 copy '''
+        tle = TLE_4() if isinstance( self, LazyTLE_4 ) else TLE_2()
+        for name in list(_COMMON) + list(_TYPE2):
+            setattr( tle, name, getattr( self, name ) )
+        return tle
+
+class LazyTLE_2( LazyTLE ):
+    __slots__ = ()
+    generateLine1 = TLE_2.generateLine1
+    generateLine2 = TLE_2.generateLine2
+    generateLines = TLE_2.generateLines
+    _buildLine1   = TLE_2._buildLine1
+    _buildLine2   = TLE_2._buildLine2
+    _formatLine1  = TLE_2._formatLine1
+    _formatLine2  = TLE_2._formatLine2
+
+class LazyTLE_4( LazyTLE ):
+    __slots__ = ()
+    generateLine1 = TLE_4.generateLine1
+    generateLine2 = TLE_4.generateLine2
+    generateLines = TLE_4.generateLines
+    _buildLine1   = TLE_4._buildLine1
+    _buildLine2   = TLE_4._buildLine2
+    _formatLine1  = TLE_4._formatLine1
+    _formatLine2  = TLE_4._formatLine2
+
+_install( LazyTLE,   _COMMON )
+_install( LazyTLE_2, _TYPE2 )
+_install( LazyTLE_4, _TYPE4 )
@@ -0,0 +1,190 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# incremental refresh of a catalog from a full feed (one current elset per object)
+# every record of the new feed is framed and hashed straight from its raw bytes (name, line 1, line 2)
+# and compared against the hash kept for the same satno; only new or changed records are parsed, and
+# the catalog rows are overwritten / deleted / inserted in place
+
+import os
+import time
+import numpy as np
+
+from .arrays import alpha_to_integer_array
+from .catalog import TLECatalog, TLE_DTYPE, _frame, _gather, _names
+from .validate import validate_arrays, BAD_LINENO, SATNO_MISMATCH
+
+# feed records failing these checks cannot be parsed at all (TLECatalog.from_arrays raises on them)
+_UNPARSABLE = BAD_LINENO | SATNO_MISMATCH
+
+_PRIME = np.uint64( 0x100000001b3 )
+_SEED  = np.uint64( 0xcbf29ce484222325 )
+_MASK  = np.array( [ ( 1 << ( 8 * k ) ) - 1 for k in range(8) ] + [ ( 1 << 64 ) - 1 ], dtype=np.uint64 )
+
+# -----------------------------------------------------------------------------------------------------
+def _words( buf, pad ):
+    ''' the buffer (plus pad zero bytes) as unaligned little endian 8 byte words starting at every byte offset '''
+    B = np.concatenate( ( np.frombuffer( buf, dtype=np.uint8 ), np.zeros( pad + 8, dtype=np.uint8 ) ) )
+    return np.ndarray( shape=( len(B) - 7, ), dtype='<u8', buffer=B, strides=( 1, ) )
+
+def _mix( h, V, starts, lengths ):
+    ''' fold bytes starts : starts + lengths of every record into h, one word column at a time '''
+    if len(lengths) == 0: return h
+    full = int( lengths.min() )
+    for j in range( 0, int( lengths.max() ), 8 ):
+        w = V[ starts + j ]
+        if j + 8 > full: w &= _MASK[ np.clip( lengths - j, 0, 8 ) ]
+        h = ( h ^ w ) * _PRIME
+        h ^= h >> np.uint64( 29 )
+    return ( h ^ lengths.astype( np.uint64 ) ) * _PRIME
+
+def record_hashes( buf, fr ):
+    '''
+    64 bit hash of the raw name, line 1 and line 2 of every record framed in buf (see catalog._frame)
+    FNV style multiply / xor over 8 byte words, vectorized across records (the lines are never copied out)
+    '''
+    longest = max( [ int( fr[n].max( initial=0 ) ) for n in ( 'nn', 'n1', 'n2' ) ] )
+    V = _words( buf, longest )
+    h = np.full( len(fr['s1']), _SEED, dtype=np.uint64 )
+    for s, n in ( ( 'sn', 'nn' ), ( 's1', 'n1' ), ( 's2', 'n2' ) ):
+        h = _mix( h, V, fr[s], fr[n] )
+    return h
+
+def _catalog_text( catalog ):
+    ''' 3LE text of a catalog with no raw lines at hand (through the batch writer) '''
+    names = catalog.data['name'].tolist()
+    return b''.join( name + b'\n' + ( L1 + '\n' + L2 + '\n' ).encode( 'ascii' )
+                     for name, ( L1, L2 ) in zip( names, catalog.generateLines() ) )
+
+def _as_buffer( source ):
+    ''' bytes / mmap / uint8 array as is, a path is read, a list of lines is joined '''
+    if isinstance( source, ( bytes, bytearray, memoryview, np.ndarray ) ): return source
+    if isinstance( source, ( str, os.PathLike ) ):
+        with open( source, 'rb' ) as F: return F.read()
+    lines = list( source )
+    if len(lines) and isinstance( lines[0], str ): return '\n'.join( lines ).encode( 'ascii', 'replace' )
+    return b'\n'.join( lines )
+
+# -----------------------------------------------------------------------------------------------------
+class merge_report:
+    '''
+    what a refresh changed : satno arrays of added / updated / removed objects, and of the new or changed
+    feed records that were rejected as unparsable (the catalog keeps its previous row for those)
+    '''
+    def __init__(self, added, updated, removed, unchanged, elapsed, rejected=None):
+        self.added     = added
+        self.updated   = updated
+        self.removed   = removed
+        self.unchanged = unchanged
+        self.elapsed   = elapsed
+        self.rejected  = rejected if rejected is not None else np.zeros( 0, dtype=np.int64 )
+
+    @property
+    def changed( self ): return len(self.added) + len(self.updated) + len(self.removed)
+
+    def __repr__( self ):
+        return 'merge_report(added={}, updated={}, removed={}, unchanged={}, rejected={}, elapsed={:.3f}s)'.format(
+                len(self.added), len(self.updated), len(self.removed), self.unchanged, len(self.rejected), self.elapsed )
+
+class TLEMerger:
+    '''
+    keeps a TLECatalog (one elset per satno, rows sorted by satno) current against full feed refreshes
+
+        merger = TLEMerger()
+        report = merger.update( 'catalog.tle' )     # first pull : everything is "added"
+        ...
+        report = merger.update( 'catalog.tle' )     # later pulls only parse what changed
+        merger.catalog                              # updated in place
+
+    a catalog handed in is copied (the caller's object is left alone) and hashed on the lines the batch writer
+    gives for it (records whose feed lines differ from those, e.g. in checksums or padding, show up as updated
+    on the first refresh)
+    '''
+    def __init__(self, catalog=None):
+        D = catalog.data if catalog is not None else np.zeros( 0, dtype=TLE_DTYPE )
+        # one row per satno (the last one) in satno order ; the fancy index makes the copy
+        keep = len(D) - 1 - np.unique( D['satno'][::-1], return_index=True )[1]
+        self.catalog = TLECatalog( D[ keep ] )
+        text = _catalog_text( self.catalog )
+        self.hashes = record_hashes( text, _frame( text ) )
+
+    def update( self, source, remove : bool = True ):
+        '''
+        refresh from a full feed (bytes, path or list of lines); remove=False keeps objects missing from it
+        only new / changed records are parsed; those that cannot be (line numbers, line 1 / line 2 satno
+        disagreement) are skipped and listed in merge_report.rejected ; returns a merge_report
+        '''
+        t0  = time.perf_counter()
+        buf = _as_buffer( source )
+        fr  = _frame( buf )
+        sat, bad = alpha_to_integer_array( _gather( buf, fr['s1'] + 2, fr['n1'] - 2, width=5 ) )
+
+        # last record of each satno in the feed (records with an unreadable satno cannot be matched, they are dropped)
+        last = len(sat) - 1 - np.unique( sat[::-1], return_index=True )[1]
+        last = last[ ~bad[last] ]
+        sat  = sat[last]
+        h    = record_hashes( buf, { k : v[last] for k, v in fr.items() } )
+
+        D   = self.catalog.data
+        old = D['satno'].astype( np.int64 )
+        pos = np.searchsorted( old, sat )
+        known = pos < len(old)
+        known[known] = old[ pos[known] ] == sat[known]
+        changed = known.copy()
+        changed[known] = self.hashes[ pos[known] ] != h[known]
+        new  = ~known
+        gone = ~np.isin( old, sat ) if remove else np.zeros( len(old), dtype=bool )
+
+        # parse only what is new or different, leaving out records the parser would choke on
+        todo = np.flatnonzero( changed | new )
+        sel  = last[todo]
+        A1   = _gather( buf, fr['s1'][sel], fr['n1'][sel] )
+        A2   = _gather( buf, fr['s2'][sel], fr['n2'][sel] )
+        ok   = ( validate_arrays( A1, A2 )[1] & _UNPARSABLE ) == 0
+        rejected = np.zeros( len(sat), dtype=bool )
+        rejected[ todo[~ok] ] = True
+        changed &= ~rejected
+        new     &= ~rejected
+        todo, sel = todo[ok], sel[ok]
+        if len(todo):
+            parsed = TLECatalog.from_arrays( A1[ok], A2[ok] ).data
+            parsed['name'] = _names( buf, fr['sn'][sel], fr['nn'][sel] )
+        else: parsed = np.zeros( 0, dtype=TLE_DTYPE )
+        upd = changed[todo]
+
+        # overwrite in place, then delete / insert (rows stay in satno order)
+        rows = pos[changed]
+        D[rows] = parsed[upd]
+        self.hashes[rows] = h[changed]
+        self.catalog.invalidate()
+        if np.any( gone ) or np.any( new ):
+            keep = ~gone
+            ins  = pos[new]
+            ins  = ins - np.concatenate( ( [0], np.cumsum( gone ) ) )[ ins ]
+            self.catalog.data = np.insert( D[keep], ins, parsed[~upd] )
+            self.hashes = np.insert( self.hashes[keep], ins, h[new] )
+
+        return merge_report( sat[new], sat[changed], old[gone], int( np.sum( known & ~changed & ~rejected ) ),
+                             time.perf_counter() - t0, sat[rejected] )
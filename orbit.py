@@ -0,0 +1,237 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+# array versions of the sgp4.ext rv2coe / newtonnu routines (Vallado), for many state vectors at once
+# same branches and the same "undefined" sentinels, so the values match the scalar routines row for row
+
+import numpy as np
+
+SMALL     = 0.00000001
+UNDEFINED = 999999.1
+INFINITE  = 999999.9
+
+# per-row status of the batch initializers (TLE.fromPV_batch / TLE.fromCOE_batch)
+STATUS_OK           = 0
+STATUS_ZERO_INCL    = 1     # velocity[Z] == 0 : perfectly equatorial, no node
+STATUS_UNDEFINED    = 2     # rv2coe left an element undefined (circular / equatorial / degenerate)
+STATUS_NEGATIVE_SMA = 3     # a < 0 (hyperbolic)
+STATUS_NONFINITE    = 4     # nan / inf in the input
+
+STATUS_NAMES = { STATUS_OK           : 'ok',
+                 STATUS_ZERO_INCL    : 'zero inclination',
+                 STATUS_UNDEFINED    : 'undefined element',
+                 STATUS_NEGATIVE_SMA : 'negative semi-major axis',
+                 STATUS_NONFINITE    : 'non-finite input' }
+
+# -----------------------------------------------------------------------------------------------------
+def _mag( X ): return np.sqrt( np.einsum( 'ij,ij->i', X, X ) )
+
+def _dot( X, Y ): return np.einsum( 'ij,ij->i', X, Y )
+
+def _acos( x ): return np.arccos( np.clip( x, -1., 1. ) )
+
+def _angle( X, Y ):
+    ''' angle between the rows of X and Y, UNDEFINED where either is ~0 '''
+    mx, my = _mag( X ), _mag( Y )
+    ok = mx * my > SMALL * SMALL
+    with np.errstate( divide='ignore', invalid='ignore' ):
+        return np.where( ok, _acos( _dot( X, Y ) / ( mx * my ) ), UNDEFINED )
+
+# -----------------------------------------------------------------------------------------------------
+def newtonnu( ecc, nu ):
+    ''' eccentric and mean anomaly from the true anomaly (arrays) '''
+    ecc, nu = np.broadcast_arrays( np.asarray( ecc, dtype=float ), np.asarray( nu, dtype=float ) )
+    e0 = np.full( ecc.shape, INFINITE )
+    m  = np.full( ecc.shape, INFINITE )
+    with np.errstate( all='ignore' ):
+        circ = np.abs( ecc ) < SMALL
+        ell  = ~circ & ( ecc < 1. - SMALL )
+        hyp  = ~circ & ~ell & ( ecc > 1. + SMALL )
+        par  = ~circ & ~ell & ~hyp
+        hyp &= ( ecc > 1. ) & ( np.abs( nu ) + 0.00001 < np.pi - np.arccos( 1. / ecc ) )
+        par &= np.abs( nu ) < 168. * np.pi / 180.
+
+        e0 = np.where( circ, nu, e0 )
+        m  = np.where( circ, nu, m )
+
+        den   = 1. + ecc * np.cos( nu )
+        E     = np.arctan2( np.sqrt( 1. - ecc * ecc ) * np.sin( nu ) / den, ( ecc + np.cos( nu ) ) / den )
+        e0, m = np.where( ell, E, e0 ), np.where( ell, E - ecc * np.sin( E ), m )
+
+        H     = np.arcsinh( np.sqrt( ecc * ecc - 1. ) * np.sin( nu ) / den )
+        e0, m = np.where( hyp, H, e0 ), np.where( hyp, ecc * np.sinh( H ) - H, m )
+
+        D     = np.tan( nu * 0.5 )
+        e0, m = np.where( par, D, e0 ), np.where( par, D + D * D * D / 3., m )
+
+        below = ecc < 1.
+        mw    = np.fmod( m, 2. * np.pi )
+        mw    = np.where( mw < 0., mw + 2. * np.pi, mw )
+        m     = np.where( below, mw, m )
+        e0    = np.where( below, np.fmod( e0, 2. * np.pi ), e0 )
+    return e0, m
+
+# -----------------------------------------------------------------------------------------------------
+def rv2coe( P, V, mu ):
+    '''
+    P, V : (N, 3) position / velocity (km, km/s)
+    returns arrays p, a, ecc, incl, omega, argp, nu, m, arglat, truelon, lonper (radians),
+    with UNDEFINED / INFINITE where sgp4.ext.rv2coe would return them
+    '''
+    P = np.atleast_2d( np.asarray( P, dtype=float ) )
+    V = np.atleast_2d( np.asarray( V, dtype=float ) )
+    N = P.shape[0]
+    twopi, halfpi = 2. * np.pi, 0.5 * np.pi
+    und = lambda : np.full( N, UNDEFINED )
+
+    with np.errstate( all='ignore' ):
+        magr = _mag( P )
+        magv = _mag( V )
+
+        # ------------------ find h n and e vectors ----------------
+        H    = np.cross( P, V )
+        magh = _mag( H )
+        ok   = magh > SMALL
+        Nv   = np.stack( ( -H[:, 1], H[:, 0], np.zeros( N ) ), axis=1 )
+        magn = _mag( Nv )
+        c1    = magv * magv - mu / magr
+        rdotv = _dot( P, V )
+        E     = ( c1[:, None] * P - rdotv[:, None] * V ) / mu
+        ecc   = _mag( E )
+
+        # ------------ find a e and semi-latus rectum ----------
+        sme = magv * magv * 0.5 - mu / magr
+        a   = np.where( np.abs( sme ) > SMALL, -mu / ( 2. * sme ), INFINITE )
+        p   = magh * magh / mu
+
+        # ----------------- find inclination -------------------
+        incl = np.arccos( H[:, 2] / magh )
+
+        # -------- determine type of orbit for later use --------
+        circular   = ecc < SMALL
+        equatorial = ( incl < SMALL ) | ( np.abs( incl - np.pi ) < SMALL )
+        ei = ~circular & ~equatorial
+        ee = ~circular & equatorial
+        ce = circular & equatorial
+        ci = circular & ~equatorial
+        elliptic = ei | ee
+
+        # ---------- find longitude of ascending node ------------
+        omega = _acos( Nv[:, 0] / magn )
+        omega = np.where( Nv[:, 1] < 0., twopi - omega, omega )
+        omega = np.where( magn > SMALL, omega, UNDEFINED )
+
+        # ---------------- find argument of perigee ---------------
+        argp = _angle( Nv, E )
+        argp = np.where( E[:, 2] < 0., twopi - argp, argp )
+        argp = np.where( ei, argp, UNDEFINED )
+
+        # ------------ find true anomaly at epoch -------------
+        nu = _angle( E, P )
+        nu = np.where( rdotv < 0., twopi - nu, nu )
+        nu = np.where( elliptic, nu, UNDEFINED )
+
+        # ---- find argument of latitude - circular inclined -----
+        arglat = _angle( Nv, P )
+        arglat = np.where( P[:, 2] < 0., twopi - arglat, arglat )
+        arglat = np.where( ci, arglat, UNDEFINED )
+
+        # -- find longitude of perigee - elliptical equatorial ----
+        lonper = _acos( E[:, 0] / ecc )
+        lonper = np.where( E[:, 1] < 0., twopi - lonper, lonper )
+        lonper = np.where( incl > halfpi, twopi - lonper, lonper )
+        lonper = np.where( ( ecc > SMALL ) & ee, lonper, UNDEFINED )
+
+        # -------- find true longitude - circular equatorial ------
+        truelon = _acos( P[:, 0] / magr )
+        truelon = np.where( P[:, 1] < 0., twopi - truelon, truelon )
+        truelon = np.where( incl > halfpi, twopi - truelon, truelon )
+        truelon = np.where( ( magr > SMALL ) & ce, truelon, UNDEFINED )
+
+        # ------------ find mean anomaly for all orbits -----------
+        m = np.where( ci, arglat, np.where( ce & ( magr > SMALL ), truelon, UNDEFINED ) )
+        m = np.where( elliptic, newtonnu( ecc, nu )[1], m )
+
+    out = [ p, a, ecc, incl, omega, argp, nu, m, arglat, truelon, lonper ]
+    return tuple( np.where( ok, X, UNDEFINED ) for X in out )
+
+# -----------------------------------------------------------------------------------------------------
+def mean_motion( a, mu ):
+    ''' semi-major axis (km) --> mean motion (revs / day) '''
+    with np.errstate( invalid='ignore' ):
+        return np.sqrt( mu / np.asarray( a, dtype=float ) ** 3 ) * 86400 / ( 2 * np.pi )
+
+# -----------------------------------------------------------------------------------------------------
+# perigee / apogee shells and orbit regimes, the space-track way (see TLE._calculate_apogee_perigee)
+
+from .base import EARTH_RADIUS, SMA_K   # km, space-track ; a = ( SMA_K / mean motion [rev/day] ) ** (2/3)
+
+REGIME_UNKNOWN = -1     # mean motion <= 0 / not finite
+REGIME_LEO     = 0      # apogee below 2000 km
+REGIME_MEO     = 1      # perigee above 2000 km, apogee below 35000 km
+REGIME_GEO     = 2      # geosynchronous : 0.9 -- 1.1 rev/day, ecc < 0.1
+REGIME_HEO     = 3      # everything else : highly elliptical, crossing regimes or beyond GEO
+
+REGIME_NAMES = { REGIME_UNKNOWN : 'unknown',
+                 REGIME_LEO     : 'LEO',
+                 REGIME_MEO     : 'MEO',
+                 REGIME_GEO     : 'GEO',
+                 REGIME_HEO     : 'HEO' }
+
+def shells( mm, ecc, earth_rad=EARTH_RADIUS ):
+    ''' mean motion (rev/day), eccentricity --> semi-major axis, perigee and apogee altitude (km), period (minutes) '''
+    mm  = np.asarray( mm, dtype=float )
+    ecc = np.asarray( ecc, dtype=float )
+    with np.errstate( divide='ignore', invalid='ignore' ):
+        a = ( SMA_K / mm ) ** ( 2.0 / 3.0 )
+        return a, a * ( 1 - ecc ) - earth_rad, a * ( 1 + ecc ) - earth_rad, 1440. / mm
+
+def regime( mm, ecc, perigee, apogee ):
+    ''' REGIME_* code of every orbit '''
+    mm = np.asarray( mm, dtype=float )
+    out = np.full( mm.shape, REGIME_HEO, dtype=np.int8 )
+    out[ ( perigee >= 2000. ) & ( apogee < 35000. ) ] = REGIME_MEO
+    out[ apogee < 2000. ] = REGIME_LEO
+    out[ ( mm >= 0.9 ) & ( mm <= 1.1 ) & ( np.asarray( ecc ) < 0.1 ) ] = REGIME_GEO
+    out[ ~np.isfinite( mm ) | ( mm <= 0 ) ] = REGIME_UNKNOWN
+    return out
+
+def shell_overlaps( perigee, apogee, margin=0. ):
+    '''
+    every pair ( i, j ), i < j, whose [perigee - margin, apogee + margin] shells overlap
+    sorted sweep : with rows ordered by perigee, row k overlaps exactly the rows after it up to the first
+    perigee above its apogee, so one searchsorted per row gives every partner (no N x N comparison)
+    rows with non-finite perigee / apogee are left out ; beware the pair count itself can be ~N^2 / 2
+    '''
+    perigee = np.asarray( perigee, dtype=float )
+    apogee  = np.asarray( apogee, dtype=float )
+    rows  = np.flatnonzero( np.isfinite( perigee ) & np.isfinite( apogee ) )
+    order = rows[ np.argsort( perigee[rows], kind='stable' ) ]
+    P, A  = perigee[order], np.maximum( apogee[order], perigee[order] )
+    k     = np.arange( len(order) )
+    count = np.maximum( np.searchsorted( P, A + 2 * margin, 'right' ) - k - 1, 0 )
+    I = np.repeat( k, count )
+    J = I + 1 + np.arange( len(I) ) - np.repeat( np.cumsum( count ) - count, count )
+    i, j = order[I], order[J]
+    return np.minimum( i, j ), np.maximum( i, j )
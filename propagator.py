@@ -0,0 +1,196 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+
+# initialized sgp4 Satrec objects for TLE elsets, built straight from the element values (no line
+# formatting / parsing) and kept in a bounded LRU keyed on ( satno, epoch, elements ), so repeated
+# propagation of the same elset skips SGP4 initialization altogether
+# propagate_catalog runs a whole catalog over a common time grid through SatrecArray chunks
+
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from .utils import julian
+
+_XPDOTP = 1440. / ( 2. * math.pi )      # rev/day --> rad/min
+_JD1950 = 2433281.5                   # sgp4init epochs are days since 1949 December 31 00:00 UT
+
+# -----------------------------------------------------------------------------------------------------
+def satrec_from_elements( satno, jd, bstar, ndot, nddot, ecc, argp, incl, ma, mm, raan ):
+    '''
+    sgp4 Satrec (WGS72, improved mode) from TLE units : jd of the epoch, ndot / nddot as in the TLE (rev/day^2, ^3),
+    angles in degrees, mean motion in rev/day
+    only the epoch is rounded the way a TLE line carries it (1e-8 day); every other element is used at full
+    precision, so for values with more digits than the line has room for (fromPV, fits, edited members) the
+    record is not the one twoline2rv( *generateLines() ) gives : ecc 0.00081444444 is kept as is where the
+    line says 0.0008144, about 0.5 m apart after a day for a LEO elset
+    '''
+    from sgp4.api import Satrec, WGS72
+    whole = math.floor( jd - 0.5 ) + 0.5
+    sat = Satrec()
+    sat.sgp4init( WGS72, 'i', int( satno ), ( whole - _JD1950 ) + round( jd - whole, 8 ), bstar,
+                  ndot / ( _XPDOTP * 1440. ), nddot / ( _XPDOTP * 1440. * 1440. ), ecc,
+                  math.radians( argp ), math.radians( incl ), math.radians( ma ), mm / _XPDOTP, math.radians( raan ) )
+    return sat
+
+def _jd( epoch ):
+    ''' julian.datetime_to_jd for a single datetime, without the array round trip (same arithmetic) '''
+    dt = epoch - julian._UNIX_EPOCH_DT
+    return julian._UNIX_EPOCH_JD + float( dt.days ) + ( dt.seconds * 1000000 + dt.microseconds ) / julian._US_PER_DAY
+
+def satrec_from_tle( tle ):
+    '''
+    Satrec of a TLE_2 / TLE_4 / LazyTLE, elements at full precision (see satrec_from_elements)
+    sgp4 has no type 4 model : a TLE_4 propagates as a type 0 elset with zero bstar / ndot / nddot, its B and
+    agom are not used
+    '''
+    return satrec_from_elements( tle._satno, _jd( tle._epoch ), tle._bstar, tle._ndot, tle._ndotdot,
+                                 tle._ecc, tle._argp, tle._incl, tle._ma, tle._mm, tle._raan )
+
+def elset_key( tle ):
+    ''' ( satno, epoch, element values ) : everything the Satrec depends on '''
+    return ( tle._satno, tle._epoch,
+             ( tle._bstar, tle._ndot, tle._ndotdot, tle._ecc, tle._argp, tle._incl, tle._ma, tle._mm, tle._raan ) )
+
+# per cached key : the OrderedDict's share of its hash table (measured here), the linked list node it keeps per
+# key (four words and the allocator header, which sys.getsizeof does not report) and the ( Satrec, size ) pair
+_SLOT_BYTES = sys.getsizeof( OrderedDict.fromkeys( range( 1 << 12 ) ) ) // ( 1 << 12 ) + 48 + sys.getsizeof( ( None, None ) ) + sys.getsizeof( 1 << 20 )
+
+def _entry_bytes( key, sat ):
+    '''
+    memory held by one cache entry : the Satrec, the key tuples, the values in them and the LRU slot
+    (the values are counted even when the TLE they came from still shares them, so this errs on the high side)
+    '''
+    satno, epoch, elements = key
+    return ( sat.__sizeof__() + sys.getsizeof( key ) + sys.getsizeof( satno ) + sys.getsizeof( epoch ) +
+             sys.getsizeof( elements ) + sum( sys.getsizeof( X ) for X in elements ) + _SLOT_BYTES )
+
+# -----------------------------------------------------------------------------------------------------
+class SatrecCache:
+    '''
+    bounded LRU of initialized Satrec objects, shared safely between threads
+
+        cache = SatrecCache( maxsize=50000 )
+        sat   = cache.get( tle )                      # Satrec, built on the first request only
+        sats  = cache.satrec_array( tles )            # SatrecArray for sgp4_array style propagation
+        cache.stats()                                 # hits / misses / evictions / size
+
+    max_bytes additionally caps the memory held by the cache : every entry is sized as it goes in (Satrec,
+    key and LRU slot, see _entry_bytes; about 1.7 kB each) and the oldest are evicted past the cap
+    '''
+    def __init__(self, maxsize : int = 10000, max_bytes : int = None):
+        self.maxsize   = maxsize
+        self.max_bytes = max_bytes
+        self.bytes     = 0
+        self._lru  = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get( self, tle ):
+        ''' Satrec for tle (the same object for every request while it stays cached) '''
+        key = elset_key( tle )
+        with self._lock:
+            entry = self._lru.get( key )
+            if entry is not None:
+                self._lru.move_to_end( key )
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        sat  = satrec_from_tle( tle )
+        size = _entry_bytes( key, sat )
+        with self._lock:
+            if key in self._lru: return self._lru[key][0]
+            self._lru[key] = ( sat, size )
+            self.bytes += size
+            while len(self._lru) > 1 and ( len(self._lru) > self.maxsize or
+                                           ( self.max_bytes is not None and self.bytes > self.max_bytes ) ):
+                self.bytes -= self._lru.popitem( last=False )[1][1]
+                self.evictions += 1
+        return sat
+
+    def satrec_array( self, tles ):
+        from sgp4.api import SatrecArray
+        return SatrecArray( [ self.get( T ) for T in tles ] )
+
+    def stats( self ):
+        with self._lock:
+            total = self.hits + self.misses
+            return { 'hits'      : self.hits,
+                     'misses'    : self.misses,
+                     'evictions' : self.evictions,
+                     'hit_rate'  : self.hits / total if total else 0.,
+                     'size'      : len(self._lru),
+                     'maxsize'   : self.maxsize,
+                     'bytes'     : self.bytes }
+
+    def clear( self ):
+        with self._lock:
+            self._lru.clear()
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__( self ): return len( self._lru )
+
+    def __contains__( self, tle ): return elset_key( tle ) in self._lru
+
+    def __repr__( self ):
+        return 'SatrecCache({} / {} records, {} hits, {} misses)'.format( len(self), self.maxsize, self.hits, self.misses )
+
+# -----------------------------------------------------------------------------------------------------
+# whole catalog propagation onto a common time grid, in object x time chunks sized to a memory budget
+
+_CELL_BYTES = 64        # per ( object, time ) : r and v from sgp4 (48), the error code, and slack for the copy
+
+def propagate_catalog( catalog, times, out=None, errors=None, budget : int = 1 << 28 ):
+    '''
+    TEME states of every catalog row at every time (datetimes, datetime64 or julian dates)
+    out    : (N, T, 6) float array to fill (np.memmap included), a path for a new float64 .npy memmap, or None
+    errors : (N, T) uint8 array to fill, or None
+    budget : bytes of sgp4 scratch per chunk; objects are batched into SatrecArray chunks (and times split
+             when one object row alone would not fit) so memory stays flat whatever N x T
+    returns ( states (N, T, 6) km / km/s, sgp4 error codes (N, T), 0 = ok )
+    '''
+    from .tle_fitter import split_jd
+    jd, fr = split_jd( times )
+    N, T = len(catalog), len(jd)
+    if out is None: out = np.empty( ( N, T, 6 ) )
+    elif isinstance( out, ( str, os.PathLike ) ): out = np.lib.format.open_memmap( out, mode='w+', dtype=np.float64, shape=( N, T, 6 ) )
+    if out.shape != ( N, T, 6 ): raise Exception('out must be {} not {}'.format( ( N, T, 6 ), out.shape ))
+    if errors is None: errors = np.empty( ( N, T ), dtype=np.uint8 )
+
+    cells = max( 1, budget // _CELL_BYTES )
+    tstep = min( T, cells ) if T else 1
+    ostep = max( 1, cells // max( tstep, 1 ) )
+    for i in range( 0, N, ostep ):
+        sats = catalog[ i : i + ostep ].satrecs()
+        for t in range( 0, T, tstep ):
+            e, r, v = sats.sgp4( jd[ t : t + tstep ], fr[ t : t + tstep ] )
+            out[ i : i + ostep, t : t + tstep, :3 ] = r
+            out[ i : i + ostep, t : t + tstep, 3: ] = v
+            errors[ i : i + ostep, t : t + tstep ] = e
+    return out, errors
@@ -0,0 +1,128 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+import mmap
+import os
+import numpy as np
+
+from .base import TLE
+from .catalog import TLECatalog, _frame
+from .lazy import LazyTLE
+
+# -----------------------------------------------------------------------------------------------------
+class TLEReader:
+    '''
+    streaming reader for (possibly huge) 2LE / 3LE files
+    the file is memory mapped and framed one window at a time, so memory use does not grow with file size
+    after every record / chunk handed out, `offset` is the byte offset to pass back in to resume
+
+        reader = TLEReader( 'history.tle', offset=saved )
+        for cat in reader.chunks( 100000 ):
+            ...
+            saved = reader.offset
+    '''
+    def __init__(self, path, offset : int = 0, window : int = 1 << 24):
+        self.path   = path
+        self.offset = offset
+        self.window = window
+
+    def _windows( self ):
+        ''' yields (buffer, frame, index of the complete records, buffer offset, offset past the window) '''
+        if os.path.getsize( self.path ) == 0: return
+        with open( self.path, 'rb' ) as F, mmap.mmap( F.fileno(), 0, access=mmap.ACCESS_READ ) as mm:
+            size   = len(mm)
+            window = self.window
+            pos    = self.offset
+            # a resume offset in the middle of a line moves on to the next line
+            if 0 < pos < size and mm[pos-1:pos] != b'\n':
+                nl = mm.find( b'\n', pos )
+                pos = size if nl < 0 else nl + 1
+            self.offset = pos
+            if hasattr( mm, 'madvise' ): mm.madvise( mmap.MADV_SEQUENTIAL )
+
+            while pos < size:
+                end = min( pos + window, size )
+                buf = mm[pos:end]
+                fr  = _frame( buf )
+                eof = end == size
+                complete = np.flatnonzero( fr['term'] | eof )
+
+                # carry on past the last complete record, but never hold back more than the last two
+                # lines (a name and a line 1 whose line 2 is in the next window) for the next pass
+                consumed = len(buf)
+                if not eof:
+                    consumed = fr['end'][ complete[-1] ] if len(complete) else 0
+                    nls = np.flatnonzero( np.frombuffer( buf, dtype=np.uint8 ) == ord('\n') )
+                    if len(nls) > 2: consumed = max( consumed, nls[-3] + 1 )
+                    if consumed == 0:
+                        # not even a full record fits in the window
+                        window *= 2
+                        continue
+
+                yield buf, fr, complete, pos, pos + int( consumed )
+                # drop the pages behind us from this process (they stay in the page cache)
+                done = ( ( pos + int( consumed ) ) // mmap.PAGESIZE ) * mmap.PAGESIZE
+                if done and hasattr( mm, 'madvise' ): mm.madvise( mmap.MADV_DONTNEED, 0, done )
+                pos += int( consumed )
+
+    def records( self ):
+        ''' yields (name, line1, line2) as str, name is '' for 2LE records '''
+        for buf, fr, complete, base, after in self._windows():
+            for i in complete:
+                s1, s2, sn = fr['s1'][i], fr['s2'][i], fr['sn'][i]
+                self.offset = base + int( fr['end'][i] )
+                yield ( buf[sn:sn+fr['nn'][i]].decode( 'ascii', 'replace' ).rstrip(),
+                        buf[s1:s1+fr['n1'][i]].decode( 'ascii', 'replace' ),
+                        buf[s2:s2+fr['n2'][i]].decode( 'ascii', 'replace' ) )
+            self.offset = after
+
+    def tles( self, lazy : bool = False ):
+        ''' yields TLE_2 / TLE_4 objects, one at a time (slotted, lazily decoded LazyTLE with lazy=True) '''
+        parse = LazyTLE.parseLines if lazy else TLE.parseLines
+        for name, L1, L2 in self.records():
+            yield parse( L1, L2 )
+
+    def chunks( self, size : int = 100000, validate : bool = False ):
+        '''
+        yields TLECatalog chunks of `size` elsets (the last one may be shorter)
+        validate=True drops corrupt records from each chunk (see TLECatalog.from_buffer)
+        '''
+        pending, count = [], 0
+        for buf, fr, complete, base, after in self._windows():
+            i = 0
+            while i < len(complete):
+                sel = complete[ i : i + size - count ]
+                pending.append( TLECatalog._from_frame( buf, fr, sel, validate ) )
+                count += len(sel)
+                i     += len(sel)
+                if count == size:
+                    self.offset = base + int( fr['end'][ sel[-1] ] )
+                    yield TLECatalog.concatenate( pending )
+                    pending, count = [], 0
+            # nothing is held back, so the resume point can move past the whole window
+            if count == 0: self.offset = after
+            last = after
+        if count:
+            self.offset = last
+            yield TLECatalog.concatenate( pending )
@@ -23,6 +23,7 @@
 # ###############################################################################
 
 from datetime import datetime, timedelta
+import time
 import numpy as np
 import PyTLE
 
@@ -66,6 +67,36 @@ NAME_T4 = { X[0] : i for i,X in enumerate(MAP_T4) }
 POS_T4  = { i : X[0] for i,X in enumerate(MAP_T4) }
 N_T4    = len(MAP_T4)
 
+# -----------------------------------------------------------------------------------------------------
+# precomputed linear maps, so a whole population of candidates is encoded / decoded with array ops
+# (same arithmetic as np.interp : new_lo + (x - orig_lo) * slope, clipped to the original range)
+class _linear_map:
+    def __init__(self, MAP):
+        self.fields   = [ M[1] for M in MAP ]                   # TLE data members ('_mm', ...)
+        self.columns  = [ M[1][1:] for M in MAP ]               # TLECatalog columns ('mm', ...)
+        self.orig_lo  = np.array( [ M[2][0] for M in MAP ], dtype=float )
+        self.orig_hi  = np.array( [ M[2][1] for M in MAP ], dtype=float )
+        self.new_lo   = np.array( [ M[3][0] for M in MAP ], dtype=float )
+        self.new_hi   = np.array( [ M[3][1] for M in MAP ], dtype=float )
+        self.scale    = ( self.new_hi - self.new_lo ) / ( self.orig_hi - self.orig_lo )
+        self.unscale  = ( self.orig_hi - self.orig_lo ) / ( self.new_hi - self.new_lo )
+
+    def encode( self, native ):
+        ''' native units (..., n_fields) --> optimizer range '''
+        return self.new_lo + ( np.clip( native, self.orig_lo, self.orig_hi ) - self.orig_lo ) * self.scale
+
+    def decode( self, X ):
+        ''' optimizer range (..., n_fields) --> native units, wrapping around like from_array '''
+        val = ( np.asarray( X, dtype=float ) + 1 ) % 1   # <---- TODO: this should auto-range, assumed 1 for now
+        return self.orig_lo + ( np.clip( val, self.new_lo, self.new_hi ) - self.new_lo ) * self.unscale
+
+LINEAR_T0 = _linear_map( MAP_T0 )
+LINEAR_T4 = _linear_map( MAP_T4 )
+
+def get_linear_map( tletype ):
+    if tletype == 0 or tletype == 2: return LINEAR_T0
+    if tletype == 4 : return LINEAR_T4
+
 
 
 # -----------------------------------------------------------------------------------------------------
@@ -114,12 +145,11 @@ class tle_fitter( PyTLE.TLE ):
         if self._tle._type == 0 or self._tle._type == 2: return MAP_T0
         if self._tle._type == 4 : return MAP_T4
 
-    def _val_to_mapval( self, M ):
-        human, field, orig_range, new_range = M
-        return np.interp( getattr(self._tle,field), orig_range, new_range )
+    def get_linear_map( self ): return get_linear_map( self._tle._type )
 
     def to_array( self ):
-        return np.array( [ self._val_to_mapval(X) for X in self.get_map() ] )
+        LM = self.get_linear_map()
+        return LM.encode( np.array( [ getattr( self._tle, F ) for F in LM.fields ] ) )
 
     def name_to_pos( self ):
         if self._tle._type == 0 or self._tle._type == 2: return NAME_T0
@@ -129,17 +159,18 @@ class tle_fitter( PyTLE.TLE ):
         if self._tle._type == 0 or self._tle._type == 2: return POS_T0
         if self._tle._type == 4 : return POS_T4
 
+    def field_index( self, fields ):
+        ''' column of every named field in the to_array vector '''
+        N2P = self.name_to_pos()
+        return np.array( [ N2P[F] for F in fields ], dtype=int )
+
     def get_fields( self, fields ):
-        A      = self.to_array()
-        N2P    = self.name_to_pos()
-        return np.array( [ A[ N2P[F] ] for F in fields ] )
+        return self.to_array()[ self.field_index( fields ) ]
 
     def from_fields( self, fields, arr ):
         assert len(arr) == len(fields)
-        A      = self.to_array()
-        lookup = self.name_to_pos()
-        for fname, val in zip( fields, arr ):
-            A[ lookup[fname] ] = val
+        A = self.to_array()
+        A[ self.field_index( fields ) ] = arr
         self.from_array( A )
         return self
             
@@ -158,17 +189,59 @@ class tle_fitter( PyTLE.TLE ):
 
     def from_array( self, array, note=None, satno=None, epoch=None ):
         # assume that order is preserved
-        MAP = self.get_map()
-        for i,M in enumerate(MAP): 
-            human, field, orig_range, new_range = M
-            # map it back to the range
-            val = (array[i] + 1) % 1   # <---- TODO: this should auto-range, assumed 1 for now 
-            setattr(self._tle,field,np.interp( val, new_range, orig_range ) )
+        LM = self.get_linear_map()
+        for field, val in zip( LM.fields, LM.decode( array ).tolist() ):
+            setattr( self._tle, field, val )
         if satno : self._tle.satno = satno
         if note  : self._tle.set_note( note )
         if epoch : self._tle.epoch = epoch
         return self
 
+    # -------------------------------------------------------------------------------------------------
+    # population level : N candidates at once, as an (N, n_fields) matrix around this fitter's TLE
+    def population( self, fields=None, X=None ):
+        '''
+        full (N, n_fields) matrix for a population : X holds only the named `fields` columns (N, len(fields)),
+        every other column is this TLE's own value
+        '''
+        A = self.to_array()
+        if X is None: return A[None, :]
+        X = np.atleast_2d( X )
+        P = np.repeat( A[None, :], len(X), axis=0 )
+        if fields is None: P[:] = X
+        else: P[:, self.field_index( fields )] = X
+        return P
+
+    def encode_population( self, elsets ):
+        ''' TLECatalog (or list of TLE) of this fitter's type --> (N, n_fields) matrix '''
+        if not isinstance( elsets, PyTLE.TLECatalog ): elsets = PyTLE.TLECatalog.from_tles( list(elsets) )
+        LM = self.get_linear_map()
+        return LM.encode( np.stack( [ elsets.data[C] for C in LM.columns ], axis=1 ) )
+
+    def decode_population( self, P, epoch=None ):
+        '''
+        (N, n_fields) matrix --> TLECatalog of N elsets (satno / epoch / designator ... copied from this TLE)
+        epoch : optional datetime or array of N datetimes
+        '''
+        P    = np.atleast_2d( P )
+        LM   = self.get_linear_map()
+        base = PyTLE.TLECatalog.from_tles( [ self._tle ] ).data
+        data = np.repeat( base, len(P) )
+        native = LM.decode( P )
+        for i, C in enumerate( LM.columns ): data[C] = native[:, i]
+        if epoch is not None:
+            data['epoch'] = np.asarray( epoch, dtype='datetime64[us]' )
+            data['jd'] = julian.datetime_to_jd( data['epoch'] )
+        return PyTLE.TLECatalog( data )
+
+    def population_lines( self, P, **kwargs ):
+        ''' (N, n_fields) matrix --> N (line1, line2) pairs '''
+        return self.decode_population( P, **kwargs ).generateLines()
+
+    def population_satrecs( self, P, **kwargs ):
+        ''' (N, n_fields) matrix --> sgp4 SatrecArray of N satellites, no line formatting in between '''
+        return self.decode_population( P, **kwargs ).satrecs()
+
     def testme( self, **kwargs ):
         print(kwargs)
 
@@ -189,11 +262,157 @@ class tle_fitter( PyTLE.TLE ):
         return self._tle.generateLines() 
 
 
-def test() :
-    from sgp4.earth_gravity import wgs72
-    from sgp4.io import twoline2rv
-    from sgp4.propagation import sgp4 as sgprop
+# -----------------------------------------------------------------------------------------------------
+# ephemeris fitting : Levenberg-Marquardt in the optimizer (0--1) space
+# each iteration propagates the trial candidate and its finite-difference perturbations in one
+# SatrecArray call over every ephemeris epoch; if the trial is accepted its Jacobian is already there
+
+FIT_FIELDS = ['mean_motion', 'eccentricity', 'inclination', 'argp', 'raan', 'mean_anomaly', 'Bstar']
+
+FIT_CONVERGED   = 0
+FIT_MAX_ITER    = 1     # ran out of iterations
+FIT_STALLED     = 2     # no step reduces the residual any more (damping blew up)
+FIT_TIMEOUT     = 3     # time budget exhausted
+FIT_PROPAGATION = 4     # sgp4 could not propagate the initial guess
+FIT_ERROR       = 5     # the fit raised (catalog level fits only, see fit_catalog)
+
+FIT_STATUS = { FIT_CONVERGED   : 'converged',
+               FIT_MAX_ITER    : 'max iterations',
+               FIT_STALLED     : 'stalled',
+               FIT_TIMEOUT     : 'timeout',
+               FIT_PROPAGATION : 'propagation error',
+               FIT_ERROR       : 'error' }
+
+# only the angles may wrap around (from_array's modulo); every other field is kept inside its range,
+# otherwise e.g. a step to a slightly negative eccentricity would come back as e ~ 1
+WRAPPING = ('argp', 'raan', 'mean_anomaly')
+_EDGE    = 1e-12
+
+def split_jd( times ):
+    ''' datetimes / datetime64 (or float julian dates) --> (jd, fraction) arrays as sgp4 wants them '''
+    times = np.atleast_1d( np.asarray( times ) )
+    if np.issubdtype( times.dtype, np.floating ):
+        jd = np.floor( times - 0.5 ) + 0.5
+        return jd, times - jd
+    return julian.datetime_to_jd( times, split=True )
+
+class fit_result:
+    ''' outcome of fit_ephemeris '''
+    def __init__(self, fit, x, fields, rms, iterations, nfev, elapsed, status):
+        self.fit        = fit           # tle_fitter holding the fitted TLE
+        self.x          = x             # fitted values of `fields`, in the optimizer range
+        self.fields     = fields
+        self.rms        = rms           # position residual RMS (km)
+        self.iterations = iterations
+        self.nfev       = nfev          # number of (batched) propagation calls
+        self.elapsed    = elapsed       # seconds
+        self.status     = status
+
+    @property
+    def converged( self ): return self.status == FIT_CONVERGED
+
+    @property
+    def tle( self ): return self.fit._tle
+
+    def __repr__( self ):
+        return 'fit_result({}, rms={:.6g} km, iterations={}, nfev={}, elapsed={:.3f}s)'.format(
+                FIT_STATUS[ self.status ], self.rms, self.iterations, self.nfev, self.elapsed )
+
+def _residuals( fit, fields, X, jd, fr, target ):
+    ''' (K, T*3) position residuals of K candidates (rows of X), inf where sgp4 fails '''
+    e, r, v = fit.population_satrecs( fit.population( fields, X ) ).sgp4( jd, fr )
+    R = ( r - target[None, :, :] ).reshape( len(X), -1 )
+    R[ np.any( e != 0, axis=1 ) ] = np.inf
+    return R
+
+def fit_ephemeris( times, states, fields=None, guess=None, tletype : int = 0,
+                   max_iter : int = 50, tol : float = 1e-10, step : float = 1e-7, damping : float = 1e-3,
+                   rms_tol : float = 1., budget : float = None, fr=None ):
+    '''
+    fit a TLE to a TEME ephemeris
+    times  : T datetimes (or julian dates), states : (T, 6) position / velocity (km, km/s)
+    fields : the tle_fitter fields to solve for, everything else stays at the guess
+             (default : FIT_FIELDS that exist for the TLE type, e.g. no Bstar for type 4)
+    guess  : TLE or tle_fitter to start from (default : fromPV of the first state, at the first epoch)
+    rms_tol : once no step reduces the residual any more, the fit counts as converged if its RMS (km, as
+              reported in the fit_result) is within rms_tol, and as stalled otherwise
+    budget : optional limit on the wall time (seconds), checked every iteration
+    fr     : day fractions, when `times` are already split julian dates (see split_jd)
+    returns a fit_result (fitted tle_fitter, RMS, iterations, timing, status)
+    '''
+    t0 = time.perf_counter()
+    if fr is None: jd, fr = split_jd( times )
+    else: jd, fr = np.asarray( times, dtype=float ), np.asarray( fr, dtype=float )
+    states = np.asarray( states, dtype=float )
+    target = states[:, 0:3]
+    if guess is None:
+        epoch = julian.jd_to_datetime( jd[0], fr[0] )[0].item()
+        guess = PyTLE.TLE.fromPV_batch( epoch, states[0:1, 0:3], states[0:1, 3:], type=tletype, catalog=False )[0][0]
+    fit = tle_fitter( guess._tle if isinstance( guess, tle_fitter ) else guess )
+    N2P = fit.name_to_pos()
+    if fields is None: fields = [ F for F in FIT_FIELDS if F in N2P ]
+    fields = list( fields )
+    missing = [ F for F in fields if F not in N2P ]
+    if missing: raise Exception('{} cannot be fitted for a type {} TLE'.format( ', '.join( missing ), fit._tle._type ))
+    n  = len( fields )
+    H  = np.eye( n ) * step
+
+    def evaluate( x ):
+        R = _residuals( fit, fields, np.vstack( [ x[None, :], x[None, :] + H ] ), jd, fr, target )
+        with np.errstate( invalid='ignore' ):
+            return R[0], ( R[1:] - R[0] ).T / step, R[0] @ R[0]
+
+    bounded = np.array( [ F not in WRAPPING for F in fields ] )
+    ie, iw, im = ( fields.index( F ) if F in fields else None for F in ( 'eccentricity', 'argp', 'mean_anomaly' ) )
+    def project( x ):
+        x = x.copy()
+        # a negative eccentricity is the same orbit as (-e, argp + 180, M - 180) : reflect it
+        if ie is not None and iw is not None and im is not None and x[ie] < 0:
+            x[ie], x[iw], x[im] = -x[ie], x[iw] + 0.5, x[im] - 0.5
+        return np.where( bounded, np.clip( x, _EDGE, 1. - _EDGE - step ), x )
+
+    x = project( fit.get_fields( fields ) )
+    r, J, cost = evaluate( x )
+    nfev, it, status = 1, 0, FIT_MAX_ITER
+    if not np.isfinite( cost ): status = FIT_PROPAGATION
+    else:
+        lam = damping
+        while it < max_iter:
+            if budget is not None and time.perf_counter() - t0 > budget:
+                status = FIT_TIMEOUT
+                break
+            it += 1
+            A = J.T @ J
+            g = J.T @ r
+            try: dx = np.linalg.solve( A + lam * np.diag( np.diag( A ) + 1e-12 ), -g )
+            except np.linalg.LinAlgError: dx = np.full( n, np.nan )
+            if not np.all( np.isfinite( dx ) ) or not np.all( np.isfinite( J ) ):
+                status = FIT_STALLED
+                break
+            xt = project( x + dx )
+            rt, Jt, ct = evaluate( xt )
+            nfev += 1
+            if np.isfinite( ct ) and ct < cost:
+                done = cost - ct <= tol * cost or np.max( np.abs( xt - x ) ) < 1e-12
+                x, r, J, cost = xt, rt, Jt, ct
+                lam = max( lam / 10., 1e-12 )
+                if done:
+                    status = FIT_CONVERGED
+                    break
+            else:
+                lam *= 10.
+                if lam > 1e12:
+                    # nothing downhill left : we are sitting on the minimum (or stuck)
+                    status = FIT_CONVERGED if np.sqrt( cost / len( target ) ) <= rms_tol else FIT_STALLED
+                    break
+
+    fit.from_fields( fields, x )
+    rms = float( np.sqrt( cost / len( target ) ) ) if np.isfinite( cost ) else np.inf
+    return fit_result( fit, x, fields, rms, it, nfev, time.perf_counter() - t0, status )
+
+ephem_fit = fit_ephemeris
 
+def test() :
     # Aerocube 12A
     L1 = '1 43556U 18046C   22321.55519027  .00025005  00000+0  49749-3 0  9993'
     L2 = '2 43556  51.6329 154.1269 0008144 222.8163 137.2191 15.46745497242947'
@@ -217,20 +436,25 @@ def test() :
 
 
 
-    # test ephemeris
-    tle = twoline2rv( L1, L2, wgs72 )
+    # test ephemeris (every epoch in one vectorized sgp4 call)
+    from sgp4.api import Satrec
+    sat = Satrec.twoline2rv( L1, L2 )
     print()
-    print('tle epoch is ', julian.from_jd( tle.jdsatepoch ) )
-    tledate = julian.from_jd( tle.jdsatepoch )
-    
+    tledate = julian.from_jd( sat.jdsatepoch + sat.jdsatepochF )
+    print('tle epoch is ', tledate )
+
     mins   = np.arange(0,1440*5,10)
-    jdates = tle.jdsatepoch + mins/1440
-    eph = np.vstack( [np.hstack( sgprop(tle,D)) for D in mins ] )
+    jdates = sat.jdsatepoch + sat.jdsatepochF + mins/1440
+    e, r, v = sat.sgp4_array( np.full( len(mins), sat.jdsatepoch ), sat.jdsatepochF + mins/1440 )
+    eph = np.hstack( [ r, v ] )
 
-        # init as if we only had a state-vector
-    FIT = tle_fitter(TLE.fromPV( epoch=tledate, P=eph[0,0:3], V=eph[0,3:] ) )
+    # init as if we only had a state-vector, then fit to the whole ephemeris
+    FIT = tle_fitter( PyTLE.TLE.fromPV( epoch=tledate, P=eph[0,0:3], V=eph[0,3:] ) )
     print()
     print( str(FIT) )
+    res = fit_ephemeris( jdates, eph, guess=FIT )
+    print( res )
+    print( str(res.fit) )
 
 
 # =====================================================================================================
@@ -6,25 +6,44 @@ import numpy as np
 from numpy.typing import NDArray
 
 
-# # ------ abusing datetime with epochs
-# _J2K_EPOCH_JD  = 2451545.0
-# _J2K_EPOCH_DT  = datetime( year=2000, month=1, day=1, hour=12 )
+# ------ array versions : numpy datetime64 [us] <--> float64 julian dates
+_UNIX_EPOCH_JD = 2440587.5
+_US_PER_DAY    = 86400000000
 
-# def datetime_to_jd( dts : list[ datetime ] ) -> NDArray[np.float64] :
-#     return [ _J2K_EPOCH_JD + (( X -_J2K_EPOCH_DT ).total_seconds() / 86400.) for X in dts ]
+def _as_datetime64( dts ) -> NDArray[np.datetime64]:
+    return np.atleast_1d( np.asarray( dts, dtype='datetime64[us]' ) )
 
-# def jd_to_datetime( jds : NDArray[np.float64] ) -> list[ datetime ] :
-#     return np.array( [ _J2K_EPOCH_DT + timedelta(seconds=(X-_J2K_EPOCH_JD) * 86400 ) for X in jds ] )
+def datetime_to_jd( dts, split : bool = False ):
+    """
+    datetimes (list of datetime or datetime64 array) --> julian dates
+    split=True returns ( whole, fraction ) : whole ends in .5 and fraction is in [0, 1), the two-part
+    form sgp4 takes (keeps microseconds that a single float64 JD cannot hold)
+    """
+    us    = _as_datetime64( dts ).astype( np.int64 )
+    days  = us // _US_PER_DAY
+    whole = _UNIX_EPOCH_JD + days.astype( np.float64 )
+    frac  = ( us - days * _US_PER_DAY ) / _US_PER_DAY
+    if split: return whole, frac
+    return whole + frac
 
+def jd_to_datetime( jds, fr=None ) -> NDArray[np.datetime64]:
+    """ julian dates (optionally two-part, jds + fr) --> datetime64[us] array, rounded to the microsecond """
+    jds   = np.atleast_1d( np.asarray( jds, dtype=np.float64 ) )
+    whole = np.floor( jds - 0.5 )
+    frac  = jds - 0.5 - whole
+    if fr is not None: frac = frac + np.asarray( fr, dtype=np.float64 )
+    us = ( whole - ( _UNIX_EPOCH_JD - 0.5 ) ).astype( np.int64 ) * _US_PER_DAY + np.rint( frac * _US_PER_DAY ).astype( np.int64 )
+    return us.astype( 'datetime64[us]' )
 
-# _UNIX_EPOCH_DT = datetime( 1970, 1, 1 )
-# _UNIX_EPOCH_JD = 2440587.5
+_UNIX_EPOCH_DT = datetime( 1970, 1, 1 )
 
-# def datetime_to_unix( dts : list[ datetime ] ) -> NDArray[np.float64] :
-#     return [ ( X-_UNIX_EPOCH_DT ).total_seconds for X in dts ]
+def datetime_to_unix( dts ) -> NDArray[np.float64]:
+    """ datetimes --> seconds since 1970-01-01 """
+    return _as_datetime64( dts ).astype( np.int64 ) / 1e6
 
-# def unix_to_datetime( jds : NDArray[np.float64] ) -> list[ datetime ] :
-#     return np.array( [ _UNIX_EPOCH_DT + timedelta(seconds=X) for X in jds ] )
+def unix_to_datetime( secs ) -> NDArray[np.datetime64]:
+    """ seconds since 1970-01-01 --> datetime64[us] array """
+    return np.rint( np.atleast_1d( np.asarray( secs, dtype=np.float64 ) ) * 1e6 ).astype( np.int64 ).astype( 'datetime64[us]' )
 
 
 def to_jd(dt: datetime) -> float:
@@ -115,36 +134,55 @@ class Testing( unittest.TestCase ):
         print( 'Max delta tojd (seconds) {:10.8f}'.format( self.np.max(diff_days) * 86400 ) )
         self.assertTrue( self.np.max( diff_days ) < 1/86400. )
 
-# # -----------------------------------------------------------------------------------------------------
-# class Testing( unittest.TestCase ):
-#     @classmethod
-#     def setUpClass(self):
-#         import astropy.time
-#         import numpy as np
-#         self.np = np
-#         self._ref_jds = self.np.arange( astropy.time.Time('2000-01-01T00:00:00.000Z',format='isot').jd,
-#                                         astropy.time.Time.now().jd, 
-#                                         0.1 )
+# -----------------------------------------------------------------------------------------------------
+class TestingArrays( unittest.TestCase ):
+    @classmethod
+    def setUpClass(self):
+        import astropy.time
+        import numpy as np
+        self.np = np
+        self._ref_jds = self.np.arange( astropy.time.Time('2000-01-01T00:00:00.000Z',format='isot').jd,
+                                        astropy.time.Time.now().jd, 
+                                        0.1 )
         
-#         self._ref_dts = astropy.time.Time( self._ref_jds, format='jd').datetime
-
-#     def test_fromjd(self):
-#         test_dt = jd_to_datetime( self._ref_jds )
-#         diff_seconds = [ (ref - test).total_seconds()
-#                          for ref,test in zip( self._ref_dts, test_dt ) ]
-#         idx = self.np.argmax( diff_seconds )
-#         print('Max delta fromjd (seconds) {:10.8f} at time {}'.format( diff_seconds[idx], test_dt[idx] ) )      
-#         for dt,df in zip( test_dt, diff_seconds):
-#             if df > 0.1: print('JULIAN to DATETIME difference : {} {}'.format( dt, df )) 
-#         self.assertTrue( self.np.max(diff_seconds) < 1 )
-
-#     def test_tojd(self):
-#         test_jd = datetime_to_jd( self._ref_dts )
-#         diff_days = [ ref - test for ref,test in zip( self._ref_jds, test_jd ) ]
-#         print( 'Max delta tojd (seconds) {:10.8f}'.format( self.np.max(diff_days) * 86400 ) )
-#         for refdt,test,ref,diff in zip( self._ref_dts, test_jd, self._ref_jds, diff_days):
-#             if diff > 1/86400: print('DATETIME to JULIAN difference : {} {} {} {}'.format( refdt, test, ref, diff )) 
-#         self.assertTrue( self.np.max( diff_days ) < 1/86400. )
+        self._ref_dts = astropy.time.Time( self._ref_jds, format='jd').datetime
+
+    def test_fromjd(self):
+        test_dt = jd_to_datetime( self._ref_jds )
+        diff_seconds = self.np.abs( ( _as_datetime64( self._ref_dts ) - test_dt ) / self.np.timedelta64( 1, 's' ) )
+        idx = self.np.argmax( diff_seconds )
+        print('Max delta fromjd (seconds) {:10.8f} at time {}'.format( diff_seconds[idx], test_dt[idx] ) )      
+        self.assertTrue( self.np.max(diff_seconds) < 1 )
+
+    def test_tojd(self):
+        test_jd = datetime_to_jd( self._ref_dts )
+        diff_days = self.np.abs( self._ref_jds - test_jd )
+        print( 'Max delta tojd (seconds) {:10.8f}'.format( self.np.max(diff_days) * 86400 ) )
+        self.assertTrue( self.np.max( diff_days ) < 1/86400. )
+
+# -----------------------------------------------------------------------------------------------------
+class TestingScalarVsArray( unittest.TestCase ):
+    @classmethod
+    def setUpClass(self):
+        rng = np.random.default_rng( 0 )
+        self._dts = [ datetime( 1957, 1, 1 ) + timedelta( microseconds=int(X) )
+                      for X in rng.uniform( 0, 100 * 365.25 * _US_PER_DAY, 2000 ) ]
+
+    def test_tojd(self):
+        whole, frac = datetime_to_jd( self._dts, split=True )
+        self.assertTrue( np.all( frac >= 0 ) and np.all( frac < 1 ) and np.all( whole % 1 == 0.5 ) )
+        diff_days = np.abs( np.array( [ to_jd(D) for D in self._dts ] ) - ( whole + frac ) )
+        self.assertTrue( np.max( diff_days ) < 1e-6 / 86400. * 100 )
+
+    def test_roundtrip(self):
+        whole, frac = datetime_to_jd( self._dts, split=True )
+        self.assertTrue( np.all( jd_to_datetime( whole, frac ) == _as_datetime64( self._dts ) ) )
+        self.assertTrue( np.all( unix_to_datetime( datetime_to_unix( self._dts ) ) == _as_datetime64( self._dts ) ) )
+
+    def test_fromjd(self):
+        jds = datetime_to_jd( self._dts )
+        diff_seconds = np.abs( ( jd_to_datetime( jds ) - _as_datetime64( [ from_jd(D) for D in jds ] ) ) / np.timedelta64( 1, 's' ) )
+        self.assertTrue( np.max( diff_seconds ) < 1e-4 )
 
 # # =====================================================================================================
 if __name__ == '__main__' :
@@ -0,0 +1,134 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+# line integrity checks for whole feeds at once : mod 10 checksums, fixed column layout, line numbers and
+# line 1 / line 2 satno agreement, all as table lookups over (N, 69) uint8 arrays (no python loop per line)
+
+import numpy as np
+
+from .alpha import from_alpha
+from .catalog import _frame, _gather, LINE_LEN
+
+# reason codes (bit flags, a record can fail several checks)
+BAD_LENGTH     = 1      # a line is not 69 characters long
+BAD_LINENO     = 2      # lines do not start with "1 " / "2 "
+BAD_CHECKSUM1  = 4
+BAD_CHECKSUM2  = 8
+BAD_LAYOUT1    = 16     # a character of line 1 is not allowed in its column
+BAD_LAYOUT2    = 32
+SATNO_MISMATCH = 64
+
+REASONS = { BAD_LENGTH     : 'bad length',
+            BAD_LINENO     : 'bad line number',
+            BAD_CHECKSUM1  : 'bad checksum (line 1)',
+            BAD_CHECKSUM2  : 'bad checksum (line 2)',
+            BAD_LAYOUT1    : 'bad layout (line 1)',
+            BAD_LAYOUT2    : 'bad layout (line 2)',
+            SATNO_MISMATCH : 'satno mismatch' }
+
+# -----------------------------------------------------------------------------------------------------
+# column layout templates, one code per column :
+#   '1' '2' ' ' '.' : that exact character        d : digit           b : digit or blank
+#   s : sign ('+', '-' or blank)                  x : sign or digit   a : digit, letter or blank
+#   n : first satno character (digit, alpha-5 letter or blank)
+_TEMPLATE1 = '1 nbbbba aaaaaaaa ddbbb.bbbbbbbb x.dddddddd sdddddsd sdddddsd b bbbbd'
+_TEMPLATE2 = '2 nbbbb bbb.dddd bbb.dddd bbbbbbb bbb.dddd bbb.dddd bb.ddddddddbbbbbd'
+
+_DIGIT = '0123456789'
+_CODES = {
+        'd' : _DIGIT,
+        'b' : _DIGIT + ' ',
+        's' : '+- ',
+        'x' : '+- ' + _DIGIT,
+        'a' : _DIGIT + ' ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+        'n' : _DIGIT + ' ' + ''.join( from_alpha ),
+        }
+
+_NOT_ALLOWED = 0x80
+
+def _table( template ):
+    '''
+    one (69 * 256) lookup table per line : entry [ column * 256 + byte ] holds the checksum contribution of that
+    byte in the low bits (columns 0 -- 67 only) and _NOT_ALLOWED if the byte may not appear in that column,
+    so a single gather gives both the checksum terms and the layout check
+    '''
+    assert len(template) == LINE_LEN
+    T = np.full( ( LINE_LEN, 256 ), _NOT_ALLOWED, dtype=np.uint8 )
+    for col, code in enumerate( template ):
+        T[ col, np.frombuffer( _CODES.get( code, code ).encode(), dtype=np.uint8 ) ] = 0
+    T[ :LINE_LEN-1, ord('0'):ord('9')+1 ] |= np.arange( 10, dtype=np.uint8 )
+    T[ :LINE_LEN-1, ord('-') ] |= 1
+    return T.ravel()
+
+_TABLE1  = _table( _TEMPLATE1 )
+_TABLE2  = _table( _TEMPLATE2 )
+_OFFSETS = np.arange( LINE_LEN, dtype=np.intp ) * 256
+
+def _scan( A, table ):
+    ''' --> ( layout ok, checksum ok ) for every line of A '''
+    V = table[ _OFFSETS + A ]
+    layout = V.max( axis=1 ) < _NOT_ALLOWED
+    check  = ( V[:, :LINE_LEN-1] & 0x0F ).sum( axis=1, dtype=np.uint16 ) % 10 == A[:, LINE_LEN-1] - np.uint8( ord('0') )
+    return layout, check
+
+# -----------------------------------------------------------------------------------------------------
+def validate_arrays( A1, A2, n1=None, n2=None, block : int = 16384 ):
+    '''
+    A1, A2 : (N, 69) uint8 arrays of line 1 / line 2, n1, n2 : optional original line lengths
+    returns ( valid mask, reason bit flags ) per record
+    '''
+    A1, A2 = np.asarray( A1, dtype=np.uint8 ), np.asarray( A2, dtype=np.uint8 )
+    reasons = np.zeros( len(A1), dtype=np.uint8 )
+    if n1 is not None: reasons[ ( np.asarray(n1) != LINE_LEN ) | ( np.asarray(n2) != LINE_LEN ) ] |= BAD_LENGTH
+    reasons[ ( A1[:, 0] != ord('1') ) | ( A2[:, 0] != ord('2') ) ] |= BAD_LINENO
+    reasons[ np.any( A1[:, 2:7] != A2[:, 2:7], axis=1 ) ] |= SATNO_MISMATCH
+    # blocks keep the gathers in cache
+    for i in range( 0, len(A1), block ):
+        R = reasons[i:i+block]
+        layout, check = _scan( A1[i:i+block], _TABLE1 )
+        R[ ~layout ] |= BAD_LAYOUT1
+        R[ ~check ]  |= BAD_CHECKSUM1
+        layout, check = _scan( A2[i:i+block], _TABLE2 )
+        R[ ~layout ] |= BAD_LAYOUT2
+        R[ ~check ]  |= BAD_CHECKSUM2
+    return reasons == 0, reasons
+
+def validate_buffer( buf ):
+    '''
+    frame a 2LE / 3LE text buffer (bytes, mmap or uint8 array) and validate every record
+    returns ( valid mask, reason bit flags, frame ) ; the frame holds the byte offsets of each record (see catalog._frame)
+    '''
+    fr = _frame( buf )
+    valid, reasons = validate_arrays( _gather( buf, fr['s1'], fr['n1'] ), _gather( buf, fr['s2'], fr['n2'] ), fr['n1'], fr['n2'] )
+    return valid, reasons, fr
+
+def validate_lines( lines ):
+    ''' validate_buffer for a list of str / bytes lines '''
+    lines = list( lines )
+    if len(lines) and isinstance( lines[0], str ): return validate_buffer( '\n'.join( lines ).encode( 'ascii', 'replace' ) )
+    return validate_buffer( b'\n'.join( lines ) )
+
+def describe( reasons ):
+    ''' reason bit flags --> list of the failed checks '''
+    return [ name for flag, name in REASONS.items() if int(reasons) & flag ]
@@ -0,0 +1,250 @@
+# ###############################################################################
+# MIT License
+#
+# Copyright (c) 2023 Kerry Wood
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ###############################################################################
+
+# batch version of TLE_2 / TLE_4 generateLine1 / generateLine2
+# every line of the catalog is written into one preallocated (N, 2, 70) byte buffer, column by column
+# rows whose values do not fit the fixed-width layout (or that sit on a rounding tie, where numpy and
+# str.format might disagree) are handed to the per-object writer instead, so output is byte-identical
+
+from datetime import datetime
+import unittest
+import numpy as np
+
+from .arrays import integer_to_alpha_array, datetime64_to_epoch_parts, datetime64_to_epoch_str, generate_checksums
+from .catalog import TLECatalog, LINE_LEN, _synthetic_elsets
+from .formatters import datetime_to_epochstr
+
+ROW_LEN = LINE_LEN + 1      # line plus newline
+
+_SPACE, _ZERO, _DOT = ord(' '), ord('0'), ord('.')
+
+# python's own powers of ten (to match str.format through the same rounding)
+_POW10 = np.array( [ 10. ** e for e in range(-20, 21) ] )
+
+_TIE = 1e-5
+
+# -----------------------------------------------------------------------------------------------------
+def _scaled( x, ndec ):
+    ''' round(x * 10**ndec) and whether that rounding is too close to a tie to trust '''
+    y = x * 10. ** ndec
+    r = np.rint( y )
+    return r.astype( np.int64 ), np.abs( np.abs( y - np.trunc( y ) ) - 0.5 ) < _TIE
+
+def _put_int( L, col, v, width, pad=_ZERO ):
+    ''' non-negative ints v, right justified into columns [col, col+width) of L '''
+    place = 10 ** np.arange( width-1, -1, -1, dtype=np.int64 )
+    D = ( v[:, None] // place ) % 10 + _ZERO
+    if pad != _ZERO:
+        lead = ( v[:, None] < place ) & ( np.arange( width ) < width - 1 )
+        D[ lead ] = pad
+    L[:, col:col+width] = D
+
+def _put_fixed( L, col, v, nint, ndec, pad ):
+    ''' fixed point number from its scaled integer v : nint integer digits, '.', ndec decimals '''
+    _put_int( L, col, v // 10 ** ndec, nint, pad )
+    L[:, col+nint] = _DOT
+    _put_int( L, col+nint+1, v % 10 ** ndec, ndec )
+
+def _put_angle( L, col, x ):
+    ''' "{:>8.4f}".format(x)[:8] for 0 <= x < 1000 '''
+    v, tie = _scaled( x, 4 )
+    _put_fixed( L, col, v, 3, 4, _SPACE )
+    return tie | ( x < 0 ) | ( v > 9999999 )
+
+def _put_expo( L, col, x ):
+    ''' generate_expo_format : sign, 5 mantissa digits, exponent sign and digit '''
+    a = np.abs( x )
+    small = a < 9.9999e-9
+    with np.errstate( divide='ignore', invalid='ignore' ):
+        e = np.floor( np.log10( np.where( small, 1., a ) ) ).astype( np.int64 )
+    e = np.clip( e, -19, 19 )
+    # log10 can be off by one right at a power of ten
+    e -= a < _POW10[ e + 20 ]
+    e += a >= _POW10[ e + 21 ]
+    m, tie = _scaled( a * _POW10[ 4 - e + 20 ], 0 )
+    roll = m >= 100000
+    m, e = np.where( roll, m // 10, m ), e + roll
+    e1 = e + 1
+    m, e1 = np.where( small, 0, m ), np.where( small, 0, e1 )
+
+    L[:, col] = np.where( ( x < 0 ) & ~small, ord('-'), ord('+') )
+    _put_int( L, col+1, m, 5 )
+    L[:, col+6] = np.where( ( e1 < 0 ) | small, ord('-'), ord('+') )
+    _put_int( L, col+7, np.abs( e1 ), 1 )
+    return ~small & ( tie | ( np.abs( e ) > 9 ) | ( np.abs( e1 ) > 9 ) | ~np.isfinite( x ) )
+
+def _put_satno( L, satno ):
+    L[:, 2:7], bad = integer_to_alpha_array( satno )
+    return bad
+
+def _put_epoch( L, col, epoch ):
+    ''' datetime_to_epochstr : YYDDD.DDDDDDDD (integer arithmetic on both sides, so no tie check is needed) '''
+    yy, ddd, dec, bad = datetime64_to_epoch_parts( epoch )
+    _put_int( L, col, yy, 2 )
+    _put_int( L, col+2, ddd, 3 )
+    L[:, col+5] = _DOT
+    _put_int( L, col+6, dec, 8 )
+    return bad
+
+def _put_text( L, col, text, width ):
+    ''' str.rjust( width ) of a fixed width bytes column '''
+    T = np.ascontiguousarray( text ).view( np.uint8 ).reshape( len(text), text.dtype.itemsize )[:, :width]
+    n = np.count_nonzero( T, axis=1 )
+    idx = np.arange( width ) - ( width - n )[:, None]
+    L[:, col:col+width] = np.where( idx >= 0, np.take_along_axis( T, np.clip( idx, 0, None ), axis=1 ), _SPACE )
+
+def _checksum( L ):
+    L[:, LINE_LEN-1] = generate_checksums( L, LINE_LEN-1 )
+
+# -----------------------------------------------------------------------------------------------------
+def _line1( L, D, t4 ):
+    bad  = _put_satno( L, D['satno'] )
+    L[:, 0] = ord('1')
+    L[:, 7] = D['class'].view( np.uint8 )
+    bad |= L[:, 7] == 0
+    _put_text( L, 9, D['intld'], 8 )
+    bad |= _put_epoch( L, 18, D['epoch'] )
+
+    # ndot : format_ndot for type 0/2, a constant for type 4
+    nd, tie = _scaled( np.abs( D['ndot'] ), 8 )
+    _put_fixed( L, 33, nd, 1, 8, _SPACE )
+    neg = D['ndot'] < 0
+    L[neg, 33] = ord('-')
+    bad |= ~t4 & ( tie | ( nd > 99999999 ) )
+    L[t4, 33:43] = np.frombuffer( b'+.00000000', dtype=np.uint8 )
+
+    bad |= _put_expo( L, 44, np.where( t4, D['agom'], D['ndotdot'] ) )
+    bad |= _put_expo( L, 53, np.where( t4, D['B'],    D['bstar'] ) )
+    L[:, 62] = np.where( t4, ord('4'), ord('0') )
+
+    # elset : space padded for type 0/2, last four digits zero padded for type 4
+    elset = D['elset'].astype( np.int64 )
+    _put_int( L, 64, np.where( t4, elset % 10000, elset ), 4, _SPACE )
+    L[t4, 64:68] = ( ( elset[t4, None] // 10 ** np.arange( 3, -1, -1 ) ) % 10 + _ZERO )
+    bad |= ( elset < 0 ) | ( ~t4 & ( elset > 9999 ) )
+    return bad
+
+def _line2( L, D, t4 ):
+    bad  = _put_satno( L, D['satno'] )
+    L[:, 0] = ord('2')
+    bad |= _put_angle( L, 8,  D['incl'] )
+    bad |= _put_angle( L, 17, D['raan'] )
+    bad |= _put_angle( L, 34, D['argp'] )
+    bad |= _put_angle( L, 43, D['ma'] )
+
+    # format_ecc : "{:9.7f}"[2:]
+    ecc, tie = _scaled( D['ecc'], 7 )
+    _put_int( L, 26, ecc % 10000000, 7 )
+    bad |= tie | ( D['ecc'] < 0 ) | ( ecc > 99999999 )
+
+    # "{:>011.8f}" mean motion
+    mm, tie = _scaled( D['mm'], 8 )
+    _put_fixed( L, 52, mm, 2, 8, _ZERO )
+    bad |= tie | ( D['mm'] < 0 ) | ( mm > 9999999999 )
+
+    # elset : zero padded for type 0/2 (longer ones are truncated, left to the per-object writer), last four digits for type 4
+    elset = D['elset'].astype( np.int64 )
+    _put_int( L, 64, elset % 10000, 4 )
+    bad |= ( elset < 0 ) | ( ~t4 & ( elset > 9999 ) )
+    return bad
+
+def generate_buffer( catalog ):
+    '''
+    write every row of a TLECatalog into an (N, 2, 70) uint8 buffer (line 1, line 2, each with a newline)
+    returns the buffer and the index of the rows that must go through the per-object writer
+    '''
+    D  = catalog.data
+    N  = len(D)
+    t4 = D['type'] == 4
+    buf = np.full( ( N, 2, ROW_LEN ), _SPACE, dtype=np.uint8 )
+    buf[:, :, LINE_LEN] = ord('\n')
+    L1, L2 = buf[:, 0, :], buf[:, 1, :]
+
+    bad  = ~np.isin( D['type'], ( 0, 2, 4 ) )
+    with np.errstate( invalid='ignore', over='ignore' ):
+        bad |= _line1( L1, D, t4 )
+        bad |= _line2( L2, D, t4 )
+    _checksum( L1 )
+    _checksum( L2 )
+    return buf, np.flatnonzero( bad )
+
+def _as_catalog( elsets ):
+    return elsets if isinstance( elsets, TLECatalog ) else TLECatalog.from_tles( list(elsets) )
+
+def generate_lines( elsets ):
+    ''' [ (line1, line2), ... ] for a TLECatalog or a list of TLE objects '''
+    cat = _as_catalog( elsets )
+    buf, slow = generate_buffer( cat )
+    text = buf[:, :, :LINE_LEN].tobytes().decode( 'ascii' )
+    lines = [ ( text[i:i+LINE_LEN], text[i+LINE_LEN:i+2*LINE_LEN] ) for i in range( 0, len(text), 2*LINE_LEN ) ]
+    for i in slow: lines[i] = cat.get_tle( i ).generateLines()
+    return lines
+
+def generate_bytes( elsets ):
+    ''' the whole catalog (or list of TLE objects) as 2LE text '''
+    cat = _as_catalog( elsets )
+    buf, slow = generate_buffer( cat )
+    if len(slow) == 0: return buf.tobytes()
+    rows = [ buf[i].tobytes() for i in range(len(buf)) ]
+    for i in slow: rows[i] = ( '\n'.join( cat.get_tle( i ).generateLines() ) + '\n' ).encode( 'ascii' )
+    return b''.join( rows )
+
+# -----------------------------------------------------------------------------------------------------
+class TestingCatalogWrite( unittest.TestCase ):
+    @classmethod
+    def setUpClass(self):
+        self._tles = _synthetic_elsets( 5000, seed=2 )
+        # rows the array writer hands to the per-object writer : too long for their columns
+        over = _synthetic_elsets( 0, seed=3 )
+        over[0]._elset, over[1]._ndot, over[2]._mm, over[3]._raan, over[4]._ecc = 12345, 1.5, 123.4, 1e7, 1.
+        over[5]._epoch = datetime( 2056, 12, 31, 23, 59, 59, 999999 )      # rounds out of the 1957 -- 2056 window
+        self._tles += over
+
+    def test_generate_buffer(self):
+        buf, slow = generate_buffer( TLECatalog.from_tles( self._tles ) )
+        self.assertTrue( len(slow) > 0 and np.all( slow >= 5000 ) )
+        fast = np.setdiff1d( np.arange( len(self._tles) ), slow )
+        for i in fast:
+            L1, L2 = self._tles[i].generateLines()
+            self.assertEqual( buf[i, 0, :LINE_LEN].tobytes().decode(), L1 )
+            self.assertEqual( buf[i, 1, :LINE_LEN].tobytes().decode(), L2 )
+
+    def test_epoch_rollover(self):
+        # rounding to 1e-8 day at the very end of a year carries into day 001 of the next one
+        for dt, epoch in ( ( datetime( 2023, 12, 31, 23, 59, 59, 999999 ), '24001.00000000' ),
+                           ( datetime( 2024, 12, 31, 23, 59, 59, 999999 ), '25001.00000000' ),
+                           ( datetime( 1999, 12, 31, 23, 59, 59, 999999 ), '00001.00000000' ),
+                           ( datetime( 2024, 12, 31, 12 ),                 '24366.50000000' ) ):
+            self.assertEqual( datetime_to_epochstr( dt ), epoch )
+            self.assertEqual( datetime64_to_epoch_str( [ dt ] )[0].decode(), epoch )
+        self.assertTrue( datetime64_to_epoch_parts( [ datetime( 2056, 12, 31, 23, 59, 59, 999999 ) ] )[3][0] )
+
+    def test_generate_lines(self):
+        ref = [ T.generateLines() for T in self._tles ]
+        self.assertEqual( generate_lines( self._tles ), ref )
+        self.assertEqual( generate_bytes( TLECatalog.from_tles( self._tles ) ), ''.join( L1 + '\n' + L2 + '\n' for L1, L2 in ref ).encode() )
+
+# # =====================================================================================================
+if __name__ == '__main__' :
+    unittest.main()